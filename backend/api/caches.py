@@ -0,0 +1,149 @@
+import json
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+from hashlib import md5
+from threading import Lock
+from time import monotonic
+
+from core.constants import (
+    INGREDIENT_INDEX_TTL,
+    INGREDIENT_SEARCH_LIMIT,
+    SHORT_LINK_CACHE_SIZE,
+    SHORT_LINK_CACHE_TTL,
+    TAG_CATALOG_TTL
+)
+from core.metrics import record_cache
+from foodgram.models import Ingredient, Tag
+
+TagCatalogVersion = namedtuple(
+    'TagCatalogVersion',
+    ('data', 'by_id', 'etag')
+)
+
+
+class IngredientIndex:
+
+    def __init__(self, ttl=INGREDIENT_INDEX_TTL):
+        self.ttl = ttl
+        self.lock = Lock()
+        self.keys = None
+        self.entries = None
+        self.loaded_at = 0
+
+    def load(self):
+        self.entries = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda ingredient: (
+                ingredient['name'].casefold(), ingredient['id']
+            )
+        )
+        self.keys = [
+            ingredient['name'].casefold() for ingredient in self.entries
+        ]
+        self.loaded_at = monotonic()
+
+    def get_index(self):
+        with self.lock:
+            hit = (self.entries is not None
+                   and monotonic() - self.loaded_at <= self.ttl)
+            if not hit:
+                self.load()
+            record_cache('ingredients', hit)
+            return self.keys, self.entries
+
+    def invalidate(self):
+        with self.lock:
+            self.entries = None
+
+    def search(self, query, limit=INGREDIENT_SEARCH_LIMIT):
+        keys, entries = self.get_index()
+        query = query.casefold()
+        if not query:
+            return entries[:limit]
+        results = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and len(results) < limit
+               and keys[position].startswith(query)):
+            results.append(entries[position])
+            position += 1
+        for key, entry in zip(keys, entries):
+            if len(results) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                results.append(entry)
+        return results
+
+
+class TagCatalog:
+
+    def __init__(self, ttl=TAG_CATALOG_TTL):
+        self.ttl = ttl
+        self.lock = Lock()
+        self.version = None
+        self.loaded_at = 0
+
+    def load(self):
+        data = list(Tag.objects.order_by('id').values('id', 'name', 'slug'))
+        content = json.dumps(data, ensure_ascii=False).encode()
+        etag = f'"{md5(content).hexdigest()}"'
+        self.version = TagCatalogVersion(
+            data=data,
+            by_id={tag['id']: tag for tag in data},
+            etag=etag
+        )
+        self.loaded_at = monotonic()
+
+    def get(self):
+        with self.lock:
+            hit = (self.loaded_at != 0
+                   and monotonic() - self.loaded_at <= self.ttl)
+            if not hit:
+                self.load()
+            record_cache('tags', hit)
+            return self.version
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = 0
+
+
+class LRUCache:
+
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = Lock()
+        self.data = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.data:
+                record_cache(self.name, False)
+                return None
+            value, expires = self.data[key]
+            if expires < monotonic():
+                del self.data[key]
+                record_cache(self.name, False)
+                return None
+            self.data.move_to_end(key)
+            record_cache(self.name, True)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (value, monotonic() + self.ttl)
+            self.data.move_to_end(key)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.data.pop(key, None)
+
+
+ingredient_index = IngredientIndex()
+tag_catalog = TagCatalog()
+short_link_cache = LRUCache(
+    'short_links', SHORT_LINK_CACHE_SIZE, SHORT_LINK_CACHE_TTL)
@@ -0,0 +1,16 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def get_not_modified(request, etag=None, last_modified=None):
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+
+
+def set_validators(response, etag=None, last_modified=None):
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
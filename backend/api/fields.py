@@ -0,0 +1,146 @@
+import binascii
+import os
+from base64 import b64decode
+from contextlib import suppress
+from tempfile import NamedTemporaryFile
+from uuid import uuid4
+from weakref import finalize
+
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    TemporaryUploadedFile,
+    UploadedFile
+)
+from rest_framework import serializers
+
+from core.constants import BASE64_CHUNK_SIZE, IMAGE_SIGNATURES
+
+
+def get_base64_bounds(data):
+    start = data.find(';base64,', 0, BASE64_CHUNK_SIZE)
+    if start == -1:
+        return None, 0
+    return data[:start], start + len(';base64,')
+
+
+def detect_image_format(head):
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+def discard_file(file):
+    file.close()
+    with suppress(FileNotFoundError):
+        os.remove(file.name)
+
+
+class Base64UploadedFile(TemporaryUploadedFile):
+
+    def __init__(self, name, content_type):
+        file = NamedTemporaryFile(
+            suffix=f'.upload.{name.rsplit(".", 1)[-1]}',
+            dir=settings.FILE_UPLOAD_TEMP_DIR,
+            delete=False
+        )
+        UploadedFile.__init__(self, file, name, content_type, 0, None)
+        finalize(self, discard_file, file)
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'invalid_base64': 'Загрузите корректное изображение в base64',
+        'invalid_type': 'Формат изображения не поддерживается',
+        'too_large': 'Размер изображения превышает {max_size} байт',
+    }
+
+    def __init__(self, *args, **kwargs):
+        self.max_size = kwargs.pop(
+            'max_size', settings.MAX_UPLOAD_IMAGE_SIZE
+        )
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        if data in ('', None):
+            return None
+        if not isinstance(data, str):
+            self.fail('invalid_base64')
+        header, start = get_base64_bounds(data)
+        if header is not None and not header.startswith('data:image/'):
+            self.fail('invalid_type')
+        encoded_size = (
+            len(data) - start
+            - data.count('\n', start) - data.count('\r', start)
+        )
+        if encoded_size // 4 * 3 > self.max_size + 2:
+            self.fail('too_large', max_size=self.max_size)
+        chunks = self.decode_chunks(data, start)
+        head = b''
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= 16:
+                break
+        extension = detect_image_format(head)
+        if extension is None:
+            self.fail('invalid_type')
+        upload = Base64UploadedFile(
+            f'{uuid4()}.{extension}', f'image/{extension}'
+        )
+        try:
+            upload.write(head)
+            for chunk in chunks:
+                upload.write(chunk)
+            upload.size = upload.tell()
+            if upload.size > self.max_size:
+                self.fail('too_large', max_size=self.max_size)
+            upload.seek(0)
+            return super().to_internal_value(upload)
+        except serializers.ValidationError:
+            upload.close()
+            raise
+
+    def decode_chunks(self, data, start):
+        rest = ''
+        for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+            chunk = rest + ''.join(
+                data[offset:offset + BASE64_CHUNK_SIZE].split()
+            )
+            aligned = len(chunk) - len(chunk) % 4
+            chunk, rest = chunk[:aligned], chunk[aligned:]
+            if chunk:
+                yield self.decode_chunk(chunk)
+        if rest:
+            yield self.decode_chunk(rest)
+
+    def decode_chunk(self, chunk):
+        try:
+            return b64decode(chunk, validate=True)
+        except (binascii.Error, ValueError):
+            self.fail('invalid_base64')
+
+
+class BulkPrimaryKeyListField(serializers.ListField):
+    default_error_messages = {
+        'does_not_exist': 'Объекты не найдены: {ids}',
+    }
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        kwargs.setdefault('child', serializers.IntegerField())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        objects = self.queryset.in_bulk(set(ids))
+        missing = [pk for pk in dict.fromkeys(ids) if pk not in objects]
+        if missing:
+            self.fail(
+                'does_not_exist', ids=', '.join(str(pk) for pk in missing)
+            )
+        return [objects[pk] for pk in ids]
+
+    def to_representation(self, data):
+        if hasattr(data, 'all'):
+            data = data.all()
+        return [item.pk for item in data]
@@ -1,15 +1,21 @@
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, TrigramSimilarity
+)
+from django.db.models import F, Q
 from django_filters.rest_framework import (
     BooleanFilter,
     CharFilter,
     FilterSet,
-    ModelMultipleChoiceFilter
+    MultipleChoiceFilter
 )
 
-from foodgram.models import Recipe, Tag
+from api.caches import tag_catalog
+from core.constants import SEARCH_CONFIG
+from foodgram.models import Recipe
 
 
-class IngredientFilter(FilterSet):
-    name = CharFilter(lookup_expr='istartswith')
+def get_tag_choices():
+    return [(tag['slug'], tag['name']) for tag in tag_catalog.get().data]
 
 
 class RecipeTagFilter(FilterSet):
@@ -21,15 +27,17 @@ class RecipeTagFilter(FilterSet):
         field_name='favorite',
         method='filter_is_favorited'
     )
-    tags = ModelMultipleChoiceFilter(
+    tags = MultipleChoiceFilter(
         field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+        choices=get_tag_choices
     )
+    search = CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'is_in_shopping_cart', 'is_favorited', 'author']
+        fields = [
+            'tags', 'is_in_shopping_cart', 'is_favorited', 'author', 'search'
+        ]
 
     def filter_is_favorited(self, queryset, name, value):
         if value:
@@ -44,3 +52,16 @@ class RecipeTagFilter(FilterSet):
             if user.is_authenticated:
                 return queryset.filter(shopping_cart__user=user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.annotate(
+            rank=(
+                SearchRank(F('search_vector'), query)
+                + TrigramSimilarity('name', value)
+            )
+        ).filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        ).order_by('-rank', '-pub_date')
@@ -1,13 +1,22 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Prefetch, Window, prefetch_related_objects
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 from djoser.serializers import UserSerializer as BaseUserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
-from rest_framework.generics import get_object_or_404
 
+from api.fields import BulkPrimaryKeyListField, StreamingBase64ImageField
+from core.constants import RECIPE_BATCH_LIMIT
+from core.tasks import submit_on_commit
 from core.validators import (
     positive_check
 )
+from foodgram.images import delete_files, process_recipe_image
+from foodgram.similar import update_similar_recipes
 from foodgram.models import (
     Favorite,
     Ingredient,
@@ -23,6 +32,12 @@ from users_authentication.models import UserSubscription
 User = get_user_model()
 
 
+INGREDIENTS_PREFETCH = Prefetch(
+    'recipes_ingredients',
+    queryset=RecipeIngredient.objects.select_related('ingredient')
+)
+
+
 class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -49,8 +64,24 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
+class IngredientAmountListSerializer(serializers.ListSerializer):
+    default_error_messages = {
+        'does_not_exist': 'Ингредиенты не найдены: {ids}',
+    }
+
+    def validate(self, attrs):
+        ids = [item['id'] for item in attrs]
+        ingredients = Ingredient.objects.in_bulk(set(ids))
+        missing = [pk for pk in dict.fromkeys(ids) if pk not in ingredients]
+        if missing:
+            self.fail(
+                'does_not_exist', ids=', '.join(str(pk) for pk in missing)
+            )
+        return [{**item, 'id': ingredients[item['id']]} for item in attrs]
+
+
 class IngredientRecipeCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit'
@@ -59,45 +90,80 @@ class IngredientRecipeCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount',)
+        list_serializer_class = IngredientAmountListSerializer
+
+
+class RecipeImagesMixin(serializers.Serializer):
+    images = serializers.SerializerMethodField()
+
+    def get_image_url(self, image):
+        request = self.context.get('request')
+        if request is None:
+            return image.url
+        return request.build_absolute_uri(image.url)
+
+    def get_images(self, obj):
+        if not obj.image:
+            return None
+        return {
+            variant: self.get_image_url(getattr(obj, field) or obj.image)
+            for variant, field in (
+                ('thumbnail', 'image_thumbnail'),
+                ('card', 'image_card'),
+                ('full', 'image'),
+            )
+        }
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ShortRecipeSerializer(RecipeImagesMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
-    def validate(self, data):
-        recipe = self.context['recipe']
-        user = self.context['request'].user
-        try:
-            ShoppingCart.objects.create(user=user, recipe=recipe)
-        except Exception:
-            raise serializers.ValidationError()
-        return data
 
+class RecipeBatchSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_BATCH_LIMIT
+    )
 
-class FavoriteRecipeSerializer(serializers.ModelSerializer):
 
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
-        read_only_fields = ('id', 'name', 'image', 'cooking_time')
+class UserFlagMixin:
 
-    def validate(self, data):
-        recipe = self.context['recipe']
+    def get_user_flag(self, obj, name, queryset):
         user = self.context['request'].user
-        try:
-            Favorite.objects.create(user=user, favorite=recipe)
-        except Exception:
-            raise serializers.ValidationError()
-        return data
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, name):
+            return getattr(obj, name)
+        return queryset.filter(user=user).exists()
+
+
+class RecipeFlagsMixin(UserFlagMixin):
 
+    def get_is_favorited(self, obj):
+        return self.get_user_flag(
+            obj, 'is_favorited', Favorite.objects.filter(favorite=obj.pk)
+        )
 
-class UserSerializer(BaseUserSerializer):
+    def get_is_in_shopping_cart(self, obj):
+        return self.get_user_flag(
+            obj, 'is_in_shopping_cart',
+            ShoppingCart.objects.filter(recipe=obj.pk)
+        )
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
+
+class UserSerializer(UserFlagMixin, BaseUserSerializer):
     is_subscribed = serializers.SerializerMethodField()
-    avatar = Base64ImageField(required=False, allow_null=True)
+    avatar = StreamingBase64ImageField(required=False, allow_null=True)
 
     class Meta(BaseUserSerializer.Meta):
         model = User
@@ -108,17 +174,54 @@ class UserSerializer(BaseUserSerializer):
         ]
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return UserSubscription.objects.filter(
-                user=user, subscribed=obj
-            ).exists()
-        return False
+        return self.get_user_flag(
+            obj, 'is_subscribed',
+            UserSubscription.objects.filter(subscribed=obj)
+        )
+
+
+def get_recipes_limit(request):
+    try:
+        return int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_recent_recipes(authors, limit):
+    recipes = Recipe.objects.defer('search_vector').filter(
+        author__in=authors
+    )
+    if limit is None:
+        return recipes
+    numbered = recipes.annotate(row_number=Window(
+        expression=RowNumber(),
+        partition_by=F('author'),
+        order_by=(F('pub_date').desc(), F('id').desc())
+    )).values('id', 'row_number')
+    sql, params = numbered.query.sql_with_params()
+    return Recipe.objects.defer('search_vector').filter(pk__in=RawSQL(
+        f'SELECT id FROM ({sql}) AS numbered WHERE row_number <= %s',
+        (*params, limit)
+    ))
+
+
+class SubscriptionListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        authors = {author.pk: author for author in data}
+        for author in authors.values():
+            author.recent_recipes = []
+        recipes = get_recent_recipes(
+            authors, get_recipes_limit(self.context['request'])
+        )
+        for recipe in recipes:
+            authors[recipe.author_id].recent_recipes.append(recipe)
+        return super().to_representation(data)
 
 
 class SubscriptionSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(UserSerializer.Meta):
         model = User
@@ -128,31 +231,22 @@ class SubscriptionSerializer(UserSerializer):
             'is_subscribed', 'recipes',
             'recipes_count', 'avatar'
         ]
+        list_serializer_class = SubscriptionListSerializer
 
     def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author=obj.pk)
-        params = self.context.get('request').query_params
-        if 'recipes_limit' in params:
-            recipes = recipes[:int(params.get('recipes_limit'))]
+        recipes = getattr(obj, 'recent_recipes', None)
+        if recipes is None:
+            recipes = Recipe.objects.filter(author=obj.pk)
+            limit = get_recipes_limit(self.context['request'])
+            if limit is not None:
+                recipes = recipes[:limit]
         serializer = ShortRecipeSerializer(recipes, many=True)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.pk).count()
-
-    def validate(self, data):
-        user = self.context['request'].user
-        sub = self.context['sub']
-        if user == sub:
-            raise serializers.ValidationError()
-        try:
-            UserSubscription.objects.create(user=user, subscribed=sub)
-        except Exception:
-            raise serializers.ValidationError()
-        return data
 
-
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(
+    RecipeImagesMixin, RecipeFlagsMixin, serializers.ModelSerializer
+):
     tags = TagSerializer(many=True)
     author = UserSerializer(read_only=True)
     ingredients = IngredientRecipeSerializer(
@@ -160,7 +254,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True,
         read_only=True
     )
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
     is_favorited = serializers.SerializerMethodField(
         read_only=True
     )
@@ -173,37 +267,23 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time'
+            'name', 'image', 'images', 'text', 'cooking_time'
         )
 
-    def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return Favorite.objects.filter(
-                user=user, favorite=obj.pk
-            ).exists()
-        return False
-
-    def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return ShoppingCart.objects.filter(
-                user=user, recipe=obj.pk
-            ).exists()
-        return False
 
-
-class RecipeCreateSerializer(serializers.ModelSerializer):
-    tags = serializers.SlugRelatedField(
-        slug_field='id',
+class RecipeCreateSerializer(
+    RecipeImagesMixin, RecipeFlagsMixin, serializers.ModelSerializer
+):
+    tags = BulkPrimaryKeyListField(
         queryset=Tag.objects.all(),
-        many=True)
+        error_messages={'does_not_exist': 'Теги не найдены: {ids}'}
+    )
     author = UserSerializer(read_only=True)
     ingredients = IngredientRecipeCreateSerializer(
         source='recipes_ingredients',
         many=True
     )
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
     is_favorited = serializers.SerializerMethodField(
         'get_is_favorited',
         read_only=True
@@ -219,7 +299,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time'
+            'name', 'image', 'images', 'text', 'cooking_time'
         )
 
     def validate(self, data):
@@ -261,42 +341,99 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             ) for value in ingredients_data
         )
         RecipeIngredient.objects.bulk_create(ingredient_set)
+        submit_on_commit(process_recipe_image, recipe.pk)
+        submit_on_commit(update_similar_recipes, recipe.pk)
+        recipe.is_favorited = False
+        recipe.is_in_shopping_cart = False
+        recipe.is_author_subscribed = False
         return recipe
 
+    def update_tags(self, instance, tags):
+        through = Recipe.tags.through
+        current = set(through.objects.filter(
+            recipe=instance
+        ).values_list('tag_id', flat=True))
+        wanted = {tag.pk for tag in tags}
+        if current - wanted:
+            through.objects.filter(
+                recipe=instance, tag_id__in=current - wanted
+            ).delete()
+        if wanted - current:
+            through.objects.bulk_create(
+                through(recipe=instance, tag_id=pk)
+                for pk in wanted - current
+            )
+        return current != wanted
+
+    def update_ingredients(self, instance, ingredients_data):
+        current = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=instance)
+        }
+        created, changed = [], []
+        for value in ingredients_data:
+            ingredient = value['id']
+            item = current.pop(ingredient.pk, None)
+            if item is None:
+                created.append(RecipeIngredient(
+                    recipe=instance, ingredient=ingredient,
+                    amount=value['amount']
+                ))
+            elif item.amount != value['amount']:
+                item.amount = value['amount']
+                changed.append(item)
+        if current:
+            RecipeIngredient.objects.filter(
+                pk__in=[item.pk for item in current.values()]
+            ).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if created:
+            RecipeIngredient.objects.bulk_create(created)
+        return bool(current or created)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags_data = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(tags_data)
-        ingredients_data = validated_data.pop('recipes_ingredients')
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        ingredient_set = (
-            RecipeIngredient(
-                recipe=instance,
-                ingredient=value.get('id'),
-                amount=value.get('amount')
-            ) for value in ingredients_data
+        tags_changed = self.update_tags(instance, validated_data.pop('tags'))
+        ingredients_changed = self.update_ingredients(
+            instance, validated_data.pop('recipes_ingredients')
         )
-        RecipeIngredient.objects.bulk_create(ingredient_set)
-        Recipe.objects.filter(pk=instance.pk).update(**validated_data)
-        return get_object_or_404(Recipe, pk=instance.pk)
-
-    def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return Favorite.objects.filter(
-                user=user, favorite=obj.pk
-            ).exists()
-        return False
-
-    def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return ShoppingCart.objects.filter(
-                user=user, recipe=obj.pk
-            ).exists()
-        return False
+        if tags_changed or ingredients_changed:
+            submit_on_commit(update_similar_recipes, instance.pk)
+        image = validated_data.pop('image', None)
+        old_images = [
+            instance.image.name,
+            instance.image_thumbnail.name,
+            instance.image_card.name
+        ]
+        if image is not None:
+            validated_data.update(
+                image=default_storage.save(
+                    instance.image.field.generate_filename(
+                        instance, image.name
+                    ),
+                    image
+                ),
+                image_thumbnail='',
+                image_card=''
+            )
+        validated_data['updated_at'] = timezone.now()
+        recipes = Recipe.objects.filter(pk=instance.pk)
+        recipes.update(**validated_data)
+        if any(
+            validated_data.get(field, getattr(instance, field))
+            != getattr(instance, field) for field in ('name', 'text')
+        ):
+            recipes.update_search_vector()
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        if image is not None:
+            submit_on_commit(delete_files, old_images)
+            submit_on_commit(process_recipe_image, instance.pk)
+        return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects([instance], 'tags', INGREDIENTS_PREFETCH)
         data = super(RecipeCreateSerializer, self).to_representation(instance)
         data['ingredients'] = IngredientRecipeSerializer(
             instance.recipes_ingredients.all(), many=True
@@ -324,7 +461,7 @@ class ShortURLSerializer(serializers.ModelSerializer):
 
 
 class AvatarSerializer(BaseUserSerializer):
-    avatar = Base64ImageField(required=False, allow_null=True)
+    avatar = StreamingBase64ImageField(required=False, allow_null=True)
 
     class Meta(BaseUserSerializer.Meta):
         model = User
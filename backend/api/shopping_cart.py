@@ -0,0 +1,83 @@
+import csv
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from core.constants import (
+    PDF_FONT_NAME,
+    PDF_FONT_SIZE,
+    PDF_LINE_HEIGHT,
+    PDF_MARGIN,
+    SHOPPING_CART_TITLE
+)
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+def render_txt(ingredients):
+    yield f'{SHOPPING_CART_TITLE}\n'
+    for item in ingredients:
+        yield (f'{item["ingredient__name"]} {item["total"]}'
+               f' {item["ingredient__measurement_unit"]}\n')
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for item in ingredients:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['total'],
+            item['ingredient__measurement_unit']
+        ))
+
+
+def get_pdf_font():
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    if Path(settings.SHOPPING_CART_FONT).exists():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_FONT)
+        )
+        return PDF_FONT_NAME
+    return 'Helvetica'
+
+
+def render_pdf(ingredients):
+    buffer = BytesIO()
+    font = get_pdf_font()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    pdf.setFont(font, PDF_FONT_SIZE)
+    y = height - PDF_MARGIN
+    pdf.drawString(PDF_MARGIN, y, SHOPPING_CART_TITLE)
+    for item in ingredients:
+        y -= PDF_LINE_HEIGHT
+        if y < PDF_MARGIN:
+            pdf.showPage()
+            pdf.setFont(font, PDF_FONT_SIZE)
+            y = height - PDF_MARGIN
+        pdf.drawString(
+            PDF_MARGIN, y,
+            f'{item["ingredient__name"]} {item["total"]}'
+            f' {item["ingredient__measurement_unit"]}'
+        )
+    pdf.save()
+    return buffer.getvalue()
+
+
+SHOPPING_CART_RENDERERS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8', StreamingHttpResponse),
+    'csv': (render_csv, 'text/csv; charset=utf-8', StreamingHttpResponse),
+    'pdf': (render_pdf, 'application/pdf', HttpResponse),
+}
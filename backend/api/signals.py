@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.caches import ingredient_index, short_link_cache, tag_catalog
+from foodgram.models import Ingredient, Recipe, ShortURL, Tag
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tag_catalog(**kwargs):
+    tag_catalog.invalidate()
+
+
+@receiver([post_save, pre_delete], sender=Ingredient)
+def touch_ingredient_recipes(instance, **kwargs):
+    Recipe.objects.filter(ingredients=instance).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver([post_save, pre_delete], sender=Tag)
+def touch_tag_recipes(instance, **kwargs):
+    Recipe.objects.filter(tags=instance).update(updated_at=timezone.now())
+
+
+# Other processes drop their copies only after SHORT_LINK_CACHE_TTL expires.
+@receiver(pre_save, sender=ShortURL)
+def invalidate_changed_short_link(instance, **kwargs):
+    if instance.pk is None:
+        return
+    keys = {instance.short_link, *ShortURL.objects.filter(
+        pk=instance.pk
+    ).values_list('short_link', flat=True)}
+    transaction.on_commit(lambda: short_link_cache.delete(*keys))
+
+
+@receiver(post_delete, sender=ShortURL)
+def invalidate_short_link(instance, **kwargs):
+    short_link_cache.delete(instance.short_link)
@@ -1,10 +1,15 @@
-import random
+from hashlib import md5
 
-from django.conf import settings
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework.backends import DjangoFilterBackend
-from django.http import FileResponse, Http404
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Count, Exists, Max, OuterRef, Sum, Value
+)
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
@@ -14,13 +19,16 @@ from rest_framework.permissions import (
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from api.filters import IngredientFilter, RecipeTagFilter
-from api.pagination import PageCastomPaginator
+from api.caches import ingredient_index, short_link_cache, tag_catalog
+from api.conditional import get_not_modified, set_validators
+from api.filters import RecipeTagFilter
+from api.pagination import CursorPaginator, PageCastomPaginator
 from api.permissions import IsAutorOrReadOnly
 from api.serializers import (
+    INGREDIENTS_PREFETCH,
     AvatarSerializer,
-    FavoriteRecipeSerializer,
     IngredientSerializer,
+    RecipeBatchSerializer,
     RecipeCreateSerializer,
     RecipeSerializer,
     ShoppingCart,
@@ -30,23 +38,62 @@ from api.serializers import (
     TagSerializer,
     UserSerializer
 )
-from core.constants import CHARACTERS, URL_LENGTH
+from api.shopping_cart import SHOPPING_CART_RENDERERS
+from core.constants import (
+    SHOPPING_CART_FORMAT_PARAM,
+    SHORT_LINK_MAX_AGE,
+    SIMILAR_LIMIT
+)
+from core.counters import change_counter
+from core.metrics import record_toggle
+from core.short_links import encode_short_link, get_recipe_link
+from core.tasks import submit_on_commit
+from core.toggles import delete_existing, insert_ignore, insert_missing
+from foodgram.feed import (
+    backfill_author,
+    fan_out_recipe,
+    is_pull_due,
+    pull_popular_authors,
+    remove_author
+)
 from foodgram.models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient, ShortURL, Tag
+    Favorite,
+    FeedEntry,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShortURL,
+    SimilarRecipe,
+    Tag
 )
+from foodgram.similar import rank_recipes
 from users_authentication.models import UserSubscription
 
 
 User = get_user_model()
 
+RECIPE_RELATIONS = {
+    'cart': (ShoppingCart, 'recipe', 'in_carts_count'),
+    'favorite': (Favorite, 'favorite', 'favorites_count'),
+}
+
 
 class UsersViewSet(DjoserUserViewSet):
     serializer_class = UserSerializer
     ordering = ('username', 'id')
+    cursor_ordering = ('username', 'id')
     pagination_class = PageCastomPaginator
 
     def get_queryset(self):
-        return User.objects.all()
+        user = self.request.user
+        queryset = User.objects.all()
+        if user.is_authenticated:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                UserSubscription.objects.filter(
+                    user=user, subscribed=OuterRef('pk')
+                )
+            ))
+        return queryset
 
     @action(
         detail=False, methods=['put', 'delete'],
@@ -80,11 +127,15 @@ class UsersViewSet(DjoserUserViewSet):
         url_path='subscriptions', permission_classes=[IsAuthenticated],
     )
     def show_subscriptions(self, request, *args, **kwargs):
-        user = request.user
-        objects = UserSubscription.objects.filter(user=user)
-        queryset = [object.subscribed for object in objects]
+        queryset = User.objects.filter(
+            subscribed_to__user=request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('username', 'id')
         paginator = PageCastomPaginator()
-        paginated_queryset = paginator.paginate_queryset(queryset, request)
+        paginated_queryset = paginator.paginate_queryset(
+            queryset, request, view=self
+        )
         serializer = SubscriptionSerializer(
             paginated_queryset, context={'request': request}, many=True,
         )
@@ -95,25 +146,45 @@ class UsersViewSet(DjoserUserViewSet):
         detail=True, methods=['post', 'delete'],
         url_path='subscribe', permission_classes=[IsAuthenticated],
     )
+    @transaction.atomic
     def subscribe(self, request, *args, **kwargs):
         user = request.user
         sub = get_object_or_404(User, pk=self.kwargs['id'])
-        if request.method == "POST":
+        if request.method == 'POST':
+            if user == sub:
+                return Response(
+                    {'errors': 'Нельзя подписаться на самого себя'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not insert_ignore(
+                UserSubscription, 'subscribed', sub.pk, user=user.pk
+            ):
+                return Response(
+                    {'errors': 'Вы уже подписаны на этого пользователя'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            user.bump_flags_version()
+            change_counter(User.objects.filter(pk=sub.pk), 'followers_count')
+            backfill_author(user.pk, sub.pk)
+            record_toggle('subscribe', 'add')
+            sub.is_subscribed = True
             serializer = SubscriptionSerializer(
-                sub, data=request.data, partial=True,
-                context={'request': request, 'sub': sub}
+                sub, context={'request': request}
             )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        elif request.method == "DELETE":
-            obj = UserSubscription.objects.filter(
-                user=user, subscribed=sub
-            ).first()
-            if obj is not None:
-                obj.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+        deleted, _ = UserSubscription.objects.filter(
+            user=user, subscribed=sub
+        ).delete()
+        if not deleted:
+            return Response(
+                {'errors': 'Вы не подписаны на этого пользователя'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        user.bump_flags_version()
+        change_counter(User.objects.filter(pk=sub.pk), 'followers_count', -1)
+        remove_author(user.pk, sub.pk)
+        record_toggle('subscribe', 'remove')
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class BaseViewSet(
@@ -129,6 +200,25 @@ class TagViewSet(BaseViewSet):
     serializer_class = TagSerializer
     pagination_class = None
 
+    def get_catalog_response(self, get_data):
+        catalog = tag_catalog.get()
+        not_modified = get_not_modified(self.request, catalog.etag)
+        if not_modified is not None:
+            return not_modified
+        return set_validators(Response(get_data(catalog)), catalog.etag)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_catalog_response(lambda catalog: catalog.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_catalog_response(self.get_catalog_tag)
+
+    def get_catalog_tag(self, catalog):
+        try:
+            return catalog.by_id[int(self.kwargs['pk'])]
+        except (KeyError, ValueError):
+            raise Http404
+
 
 class RecipesViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
@@ -136,83 +226,286 @@ class RecipesViewSet(viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeTagFilter
+    cursor_ordering = ('-pub_date', 'id')
+    feed_ordering = ('-pub_date', '-recipe_id')
     filterset_fields = (
-        'is_in_shopping_cart', 'is_favorited', 'tags', 'author'
+        'is_in_shopping_cart', 'is_favorited', 'tags', 'author', 'search'
     )
+    fetch_plan = {
+        'list': (('author',), ('tags', INGREDIENTS_PREFETCH)),
+        'retrieve': (('author',), ('tags', INGREDIENTS_PREFETCH)),
+        'feed': (('author',), ('tags', INGREDIENTS_PREFETCH)),
+        'partial_update': (('author',), ()),
+    }
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Recipe.objects.defer('search_vector')
+        select_related, prefetch_related = self.fetch_plan.get(
+            self.action, ((), ())
+        )
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, favorite=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_author_subscribed=Exists(UserSubscription.objects.filter(
+                    user=user, subscribed=OuterRef('author')
+                ))
+            )
+        return queryset
+
+    def get_etag(self):
+        if self.action == 'retrieve':
+            try:
+                state = Recipe.objects.filter(
+                    pk=self.kwargs['pk']
+                ).values_list('updated_at', 'author__updated_at').first()
+            except ValueError:
+                return None
+            if state is None:
+                return None
+        else:
+            state = self.filter_queryset(Recipe.objects.all()).order_by(
+            ).aggregate(
+                count=Count('id'),
+                updated_at=Max('updated_at'),
+                author_updated_at=Max('author__updated_at')
+            )
+        user = self.request.user
+        if user.is_authenticated:
+            state = (state, user.pk, user.flags_version)
+        key = f'{self.request.get_full_path()}|{state}'
+        return f'W/"{md5(key.encode()).hexdigest()}"'
+
+    def get_conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag()
+        if etag is not None:
+            not_modified = get_not_modified(request, etag)
+            if not_modified is not None:
+                return not_modified
+        response = handler(request, *args, **kwargs)
+        if etag is not None and response.status_code == status.HTTP_200_OK:
+            set_validators(response, etag)
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        change_counter(
+            User.objects.filter(pk=self.request.user.pk), 'recipes_count'
+        )
+        submit_on_commit(fan_out_recipe, serializer.instance.pk)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        referrers = list(SimilarRecipe.objects.filter(
+            similar=instance
+        ).values_list('recipe_id', flat=True))
+        super().perform_destroy(instance)
+        if referrers:
+            submit_on_commit(rank_recipes, referrers)
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', -1
+        )
 
     def get_serializer_class(self):
         if self.action in ['create', 'partial_update']:
             return RecipeCreateSerializer
         return RecipeSerializer
 
+    @action(
+        detail=False, methods=['get'], permission_classes=[IsAuthenticated],
+    )
+    def feed(self, request, *args, **kwargs):
+        if is_pull_due(request.user.feed_synced_at, timezone.now()):
+            submit_on_commit(pull_popular_authors, request.user.pk)
+        paginator = CursorPaginator(self.feed_ordering)
+        entries = paginator.paginate_queryset(
+            FeedEntry.objects.filter(user=request.user).only(
+                'pub_date', 'recipe'
+            ),
+            request, view=self
+        )
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in entries]
+        )
+        serializer = self.get_serializer(
+            [
+                recipes[entry.recipe_id] for entry in entries
+                if entry.recipe_id in recipes
+            ],
+            many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, *args, **kwargs):
+        try:
+            similar = list(SimilarRecipe.objects.filter(
+                recipe=self.kwargs['pk']
+            ).values_list('similar', flat=True)[:SIMILAR_LIMIT])
+        except ValueError:
+            raise Http404
+        if not similar:
+            get_object_or_404(Recipe, pk=self.kwargs['pk'])
+        recipes = Recipe.objects.defer('search_vector').in_bulk(similar)
+        serializer = ShortRecipeSerializer(
+            [recipes[pk] for pk in similar if pk in recipes],
+            many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
     @action(
         detail=True, methods=['get'],
         url_path='get-link',
     )
     def get_link(self, request, *args, **kwargs):
-        full_link = f'{settings.DOMAIN}recipes/{self.kwargs["pk"]}'
-        link = ShortURL.objects.filter(full_link=full_link).first()
-        if link is None:
-            short_links = ShortURL.objects.all()
-            while True:
-                short_link = ''.join(random.choices(CHARACTERS, k=URL_LENGTH))
-                if not short_links.filter(short_link=short_link):
-                    break
-            link = ShortURL.objects.create(
-                short_link=short_link,
-                full_link=full_link
-            )
+        recipe = get_object_or_404(Recipe, pk=self.kwargs['pk'])
+        link, _ = ShortURL.objects.get_or_create(
+            full_link=get_recipe_link(recipe.pk),
+            defaults={'short_link': encode_short_link(recipe.pk)}
+        )
         serializer = ShortURLSerializer(link)
         return Response(serializer.data)
 
-    @action(
-        detail=True, methods=['post', 'delete'],
-        url_path='shopping_cart', permission_classes=[IsAuthenticated],
-    )
-    def add_to_shopping_cart(self, request, *args, **kwargs):
+    def apply_relation_changes(self, operation, changed, delta):
+        if not changed:
+            return
+        _, _, counter = RECIPE_RELATIONS[operation]
+        self.request.user.bump_flags_version()
+        change_counter(Recipe.objects.filter(pk__in=changed), counter, delta)
+        record_toggle(
+            operation, 'add' if delta > 0 else 'remove', len(changed)
+        )
+
+    def change_recipe_relation(self, request, operation):
+        model, field, _ = RECIPE_RELATIONS[operation]
         recipe = get_object_or_404(Recipe, pk=self.kwargs['pk'])
         user = request.user
-        if request.method == "POST":
+        if request.method == 'POST':
+            if not insert_ignore(model, field, recipe.pk, user=user.pk):
+                return Response(
+                    {'errors': 'Рецепт уже добавлен'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            self.apply_relation_changes(operation, [recipe.pk], 1)
             serializer = ShortRecipeSerializer(
-                recipe,
-                data=request.data,
-                context={'request': request, 'recipe': recipe},
-                partial=True
+                recipe, context={'request': request}
             )
-            serializer.is_valid(raise_exception=True)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
+        if not delete_existing(model, field, [recipe.pk], user=user.pk):
+            return Response(
+                {'errors': 'Рецепт не был добавлен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        self.apply_relation_changes(operation, [recipe.pk], -1)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def change_recipe_relations(self, request, operation):
+        model, field, _ = RECIPE_RELATIONS[operation]
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        user = request.user
+        if request.method == 'POST':
+            found = set(Recipe.objects.filter(
+                pk__in=ids
+            ).values_list('pk', flat=True))
+            changed = set(insert_missing(
+                model, field, [pk for pk in ids if pk in found], user=user.pk
+            )) if found else set()
+            self.apply_relation_changes(operation, changed, 1)
+            results = [
+                {'id': pk, 'status': (
+                    'added' if pk in changed
+                    else 'already_added' if pk in found else 'not_found'
+                )} for pk in ids
+            ]
+        else:
+            changed = set(delete_existing(model, field, ids, user=user.pk))
+            self.apply_relation_changes(operation, changed, -1)
+            results = [
+                {'id': pk, 'status': 'removed' if pk in changed else 'absent'}
+                for pk in ids
+            ]
+        return Response({'results': results})
+
+    def clear_recipe_relations(self, request, operation):
+        model, field, _ = RECIPE_RELATIONS[operation]
+        changed = delete_existing(model, field, user=request.user.pk)
+        self.apply_relation_changes(operation, changed, -1)
+        return Response({'removed': len(changed)})
 
-        elif request.method == "DELETE":
-            obj = ShoppingCart.objects.filter(
-                user=user, recipe=recipe
-            ).first()
-            if obj is not None:
-                obj.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+    @action(
+        detail=False, methods=['post', 'delete'],
+        url_path='shopping_cart', url_name='shopping-cart-batch',
+        permission_classes=[IsAuthenticated],
+    )
+    @transaction.atomic
+    def shopping_cart_batch(self, request, *args, **kwargs):
+        return self.change_recipe_relations(request, 'cart')
+
+    @action(
+        detail=False, methods=['delete'],
+        url_path='shopping_cart/clear', url_name='shopping-cart-clear',
+        permission_classes=[IsAuthenticated],
+    )
+    @transaction.atomic
+    def clear_shopping_cart(self, request, *args, **kwargs):
+        return self.clear_recipe_relations(request, 'cart')
+
+    @action(
+        detail=False, methods=['post', 'delete'],
+        url_path='favorite', url_name='favorite-batch',
+        permission_classes=[IsAuthenticated],
+    )
+    @transaction.atomic
+    def favorite_batch(self, request, *args, **kwargs):
+        return self.change_recipe_relations(request, 'favorite')
+
+    @action(
+        detail=False, methods=['delete'],
+        url_path='favorite/clear', url_name='favorite-clear',
+        permission_classes=[IsAuthenticated],
+    )
+    @transaction.atomic
+    def clear_favorites(self, request, *args, **kwargs):
+        return self.clear_recipe_relations(request, 'favorite')
+
+    @action(
+        detail=True, methods=['post', 'delete'],
+        url_path='shopping_cart', permission_classes=[IsAuthenticated],
+    )
+    @transaction.atomic
+    def add_to_shopping_cart(self, request, *args, **kwargs):
+        return self.change_recipe_relation(request, 'cart')
 
     @action(
         detail=True, methods=['post', 'delete'],
         url_path='favorite', permission_classes=[IsAuthenticated],
     )
+    @transaction.atomic
     def get_favorite(self, request, *args, **kwargs):
-        recipe = get_object_or_404(Recipe, pk=self.kwargs['pk'])
-        user = request.user
-        if request.method == "POST":
-            serializer = FavoriteRecipeSerializer(
-                recipe, data=request.data,
-                context={'request': request, 'recipe': recipe},
-            )
-            serializer.is_valid(raise_exception=True)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        elif request.method == "DELETE":
-            obj = Favorite.objects.filter(
-                user=user, favorite=recipe
-            ).first()
-            if obj is not None:
-                obj.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+        return self.change_recipe_relation(request, 'favorite')
 
     @action(
         detail=False, methods=['get'],
@@ -220,44 +513,53 @@ class RecipesViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
     )
     def download_shopping_cart(self, request, *args, **kwargs):
-        user = request.user.username
-        cart = ShoppingCart.objects.filter(user=request.user)
-        ingreds = {}
-        for recipe in cart:
-            query = RecipeIngredient.objects.filter(recipe=recipe.recipe)
-            for recipe in query:
-                ingr_name = recipe.ingredient.name
-                ingr_amount = recipe.amount
-                if ingr_name not in ingreds:
-                    ingreds[ingr_name] = [
-                        ingr_amount, recipe.ingredient.measurement_unit
-                    ]
-                else:
-                    ingreds[ingr_name][0] += ingr_amount
-        cart = 'список' + '\n'
-        for items in ingreds:
-            cart += (f'{items} {ingreds[items][0]}'
-                     f' {ingreds.get(items)[1]}' + '\n')
-        return FileResponse(
-            cart, content_type='txt', filename=f'cart-{user}.txt'
+        file_type = request.query_params.get(SHOPPING_CART_FORMAT_PARAM, 'txt')
+        if file_type not in SHOPPING_CART_RENDERERS:
+            return Response(
+                {SHOPPING_CART_FORMAT_PARAM: [
+                    f'Доступные форматы: {", ".join(SHOPPING_CART_RENDERERS)}'
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        renderer, content_type, response_class = (
+            SHOPPING_CART_RENDERERS[file_type]
         )
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__shopping_cart__user=request.user
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(
+            total=Sum('amount')
+        ).order_by('ingredient__name')
+        response = response_class(
+            renderer(ingredients.iterator()), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="cart-{request.user.username}.{file_type}"'
+        )
+        return response
 
 
 class IngredientViewSet(BaseViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
-    filterset_fields = ('name',)
-    ordering = ('name',)
+
+    def list(self, request, *args, **kwargs):
+        return Response(
+            ingredient_index.search(request.query_params.get('name', ''))
+        )
 
 
 def redirection(request, short_link):
-    try:
-        full_link = get_object_or_404(
-            ShortURL, short_link=short_link
-        ).full_link
-        return redirect(full_link)
-    except Http404:
-        return Response(status=status.HTTP_404_NOT_FOUND)
+    full_link = short_link_cache.get(short_link)
+    if full_link is None:
+        full_link = ShortURL.objects.filter(
+            short_link=short_link
+        ).values_list('full_link', flat=True).first()
+        if full_link is None:
+            raise Http404
+        short_link_cache.set(short_link, full_link)
+    response = redirect(full_link)
+    patch_cache_control(response, public=True, max_age=SHORT_LINK_MAX_AGE)
+    return response
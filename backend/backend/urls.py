@@ -1,9 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
 from api.views import redirection
+from core.metrics import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<str:short_link>', redirection)
+    path('s/<str:short_link>', redirection),
+    path('metrics', metrics)
 ]
@@ -1,7 +1,41 @@
+BASE64_CHUNK_SIZE = 64 * 1024
 CHARACTERS = 'ABCDEFGHJKLMNOPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz234567890'
+FEED_BACKFILL_SIZE = 50
+FEED_FANOUT_LIMIT = 5000
+FEED_PULL_INTERVAL = 60
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+INGREDIENT_INDEX_TTL = 300
+INGREDIENT_SEARCH_LIMIT = 50
+LOADER_MAX_ITEM_SIZE = 1024 * 1024
+LOADER_READ_SIZE = 1024 * 1024
 MAX_DISPLAY_LENGTH = 50
 MAX_EMAIL_LENGTH = 254
 MAX_LENGTH = 256
 MAX_NAME_LENGTH = 150
 PAGE_SIZE = 6
+PDF_FONT_NAME = 'DejaVuSans'
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+PDF_MARGIN = 50
+RECIPE_BATCH_LIMIT = 100
+RECIPE_IMAGE_QUALITY = 85
+RECIPE_IMAGE_SIZES = {'thumbnail': 240, 'card': 640, 'full': 1600}
+SEARCH_CONFIG = 'russian'
+SHOPPING_CART_FORMAT_PARAM = 'type'
+SHOPPING_CART_TITLE = 'Список покупок'
+SHORT_LINK_CACHE_SIZE = 10000
+SHORT_LINK_CACHE_TTL = 600
+SHORT_LINK_MAX_AGE = 3600
+SIMILAR_BANDS = 16
+SIMILAR_BAND_ROWS = 2
+SIMILAR_BUCKET_LIMIT = 100
+SIMILAR_LIMIT = 10
+SIMILAR_SEED = 1
+SIMILAR_TAG_WEIGHT = 0.2
+TAG_CATALOG_TTL = 300
 URL_LENGTH = 3
@@ -0,0 +1,112 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+from time import monotonic
+
+from django.core.management.color import no_style
+from django.db import connection
+
+from core.constants import LOADER_MAX_ITEM_SIZE, LOADER_READ_SIZE
+
+FORMATS = {
+    '.csv': 'csv',
+    '.json': 'json',
+    '.jsonl': 'ndjson',
+    '.ndjson': 'ndjson',
+}
+
+
+class Progress:
+
+    def __init__(self, stdout, label):
+        self.stdout = stdout
+        self.label = label
+        self.count = 0
+        self.started = monotonic()
+
+    def add(self, count):
+        self.count += count
+        elapsed = monotonic() - self.started
+        self.stdout.write(
+            f'{self.label}: {self.count} за {elapsed:.1f} с '
+            f'({self.count / max(elapsed, 1e-6):.0f}/с)'
+        )
+
+
+def get_format(path):
+    return FORMATS.get(Path(path).suffix.lower())
+
+
+def iter_csv(file, fields):
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(fields, row))
+
+
+def iter_ndjson(file, fields=None):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_json_array(file, fields=None):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != '[':
+                raise ValueError('Ожидался JSON-массив')
+            started = True
+            position += 1
+            continue
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if eof:
+                raise
+            if len(buffer) - position > LOADER_MAX_ITEM_SIZE:
+                raise ValueError(
+                    'Элемент JSON-массива превышает допустимый размер'
+                )
+            chunk = file.read(LOADER_READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+        position = end
+
+
+READERS = {
+    'csv': iter_csv,
+    'json': iter_json_array,
+    'ndjson': iter_ndjson,
+}
+
+
+def iter_records(file, file_format, fields):
+    return READERS[file_format](file, fields)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def reset_sequences(*models):
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
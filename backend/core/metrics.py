@@ -0,0 +1,98 @@
+import os
+from hmac import compare_digest
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+
+from core.profiling import get_action, track_request
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время обработки запроса',
+    ('route', 'method', 'status')
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_request_db_queries',
+    'Число SQL-запросов на HTTP-запрос',
+    ('route',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+)
+REQUEST_DB_TIME = Histogram(
+    'foodgram_request_db_seconds',
+    'Время SQL-запросов на HTTP-запрос',
+    ('route',)
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests',
+    'Обращения к кешам процесса',
+    ('cache', 'result')
+)
+TOGGLES = Counter(
+    'foodgram_toggles',
+    'Изменения избранного, корзины и подписок',
+    ('operation', 'action')
+)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_toggle(operation, action, count=1):
+    TOGGLES.labels(operation, action).inc(count)
+
+
+def is_metrics_allowed(request):
+    if settings.METRICS_TOKEN and compare_digest(
+        request.headers.get('Authorization', ''),
+        f'Bearer {settings.METRICS_TOKEN}'
+    ):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics(request):
+    if not is_metrics_allowed(request):
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
+
+
+class MetricsMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.metrics_route = 'unmatched'
+        with track_request() as profile:
+            response = self.get_response(request)
+        profile.finish()
+        route = request.metrics_route
+        REQUEST_LATENCY.labels(
+            route, request.method, response.status_code
+        ).observe(profile.timings['total'])
+        REQUEST_QUERIES.labels(route).observe(profile.queries)
+        REQUEST_DB_TIME.labels(route).observe(profile.timings['db'])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_route = get_action(request, view_func)
+        return None
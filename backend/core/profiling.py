@@ -0,0 +1,153 @@
+import json
+import logging
+import random
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+class RequestProfile:
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.timings = {'db': 0.0, 'serializer': 0.0, 'view': 0.0}
+        self.active = set()
+        self.view_started = None
+        self.action = None
+
+    def execute(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.timings['db'] += perf_counter() - started
+
+    def finish(self):
+        finished = perf_counter()
+        if self.view_started is not None:
+            self.timings['view'] = finished - self.view_started
+        self.timings['total'] = finished - self.started
+
+    def get_server_timing(self):
+        return ', '.join(
+            f'{name};dur={duration * 1000:.1f}'
+            + (f';desc="{self.queries} queries"' if name == 'db' else '')
+            for name, duration in self.timings.items()
+        )
+
+    def as_dict(self):
+        return {
+            'action': self.action,
+            'queries': self.queries,
+            **{
+                f'{name}_ms': round(duration * 1000, 2)
+                for name, duration in self.timings.items()
+            },
+        }
+
+
+@contextmanager
+def section(name):
+    profile = current_profile.get()
+    if profile is None or name in profile.active:
+        yield
+        return
+    profile.active.add(name)
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        profile.timings[name] += perf_counter() - started
+        profile.active.discard(name)
+
+
+@contextmanager
+def track_request():
+    profile = current_profile.get()
+    if profile is not None:
+        yield profile
+        return
+    profile = RequestProfile()
+    token = current_profile.set(profile)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(profile.execute)
+                )
+            yield profile
+    finally:
+        current_profile.reset(token)
+
+
+def instrument_serializers():
+    data = BaseSerializer.data
+    if getattr(data.fget, 'profiled', False):
+        return
+
+    def profiled_data(serializer):
+        with section('serializer'):
+            return data.fget(serializer)
+
+    profiled_data.profiled = True
+    BaseSerializer.data = property(profiled_data)
+
+
+def get_action(request, view_func):
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+class RequestProfilingMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        instrument_serializers()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        with track_request() as profile:
+            response = self.get_response(request)
+        profile.finish()
+        if settings.PROFILING_SERVER_TIMING:
+            response['Server-Timing'] = profile.get_server_timing()
+        self.log(request, response, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return None
+        profile.action = get_action(request, view_func)
+        profile.view_started = perf_counter()
+        return None
+
+    def log(self, request, response, profile):
+        if not settings.PROFILING_LOG or (
+                profile.timings['total'] * 1000 < settings.PROFILING_SLOW_MS
+                and profile.queries < settings.PROFILING_MAX_QUERIES):
+            return
+        logger.info(json.dumps({
+            **profile.as_dict(),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+        }, ensure_ascii=False))
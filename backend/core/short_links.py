@@ -0,0 +1,31 @@
+from django.conf import settings
+
+from core.constants import CHARACTERS, URL_LENGTH
+
+BASE = len(CHARACTERS)
+DIGITS = {char: digit for digit, char in enumerate(CHARACTERS)}
+OFFSET = BASE ** URL_LENGTH
+
+
+def get_recipe_link(pk):
+    return f'{settings.DOMAIN}recipes/{pk}'
+
+
+def encode_short_link(pk):
+    number = pk + OFFSET
+    code = []
+    while number:
+        number, digit = divmod(number, BASE)
+        code.append(CHARACTERS[digit])
+    return ''.join(reversed(code))
+
+
+def decode_short_link(code):
+    number = 0
+    for char in code:
+        if char not in DIGITS:
+            raise ValueError(code)
+        number = number * BASE + DIGITS[char]
+    if number < OFFSET:
+        raise ValueError(code)
+    return number - OFFSET
@@ -0,0 +1,47 @@
+from django.db import connection
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def lock_owner(model, **owner):
+    (name, pk), = owner.items()
+    related = model._meta.get_field(name).related_model
+    list(related.objects.select_for_update().filter(
+        pk=pk
+    ).values_list('pk', flat=True))
+
+
+def insert_missing(model, field, values, **owner):
+    lock_owner(model, **owner)
+    existing = set(model.objects.filter(
+        **owner, **{f'{field}__in': values}
+    ).values_list(field, flat=True))
+    missing = [value for value in values if value not in existing]
+    (name, pk), = owner.items()
+    model.objects.bulk_create(
+        (
+            model(**{
+                model._meta.get_field(name).attname: pk,
+                model._meta.get_field(field).attname: value
+            }) for value in missing
+        ),
+        ignore_conflicts=True
+    )
+    return missing
+
+
+def insert_ignore(model, field, value, **owner):
+    return bool(insert_missing(model, field, [value], **owner))
+
+
+def delete_existing(model, field, values=None, **owner):
+    lock_owner(model, **owner)
+    rows = model.objects.filter(**owner)
+    if values is not None:
+        rows = rows.filter(**{f'{field}__in': values})
+    deleted = list(rows.values_list(field, flat=True))
+    if deleted:
+        rows.delete()
+    return deleted
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from core.tasks import submit_on_commit
 from foodgram.models import (
     Favorite,
     Ingredient,
@@ -9,6 +10,7 @@ from foodgram.models import (
     ShortURL,
     Tag
 )
+from foodgram.similar import update_similar_recipes
 
 
 class IngredientInlineAdmin(admin.TabularInline):
@@ -33,11 +35,15 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ('name', 'author')
     inlines = [IngredientInlineAdmin]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        submit_on_commit(update_similar_recipes, form.instance.pk)
+
     def get_tag(self, obj):
         return [tag.name for tag in obj.tags.all()]
 
     def add_counter(self, obj):
-        return Favorite.objects.filter(favorite=obj).count()
+        return obj.favorites_count
 
 
 class FavoriteAdmin(admin.ModelAdmin):
@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.constants import (
+    FEED_BACKFILL_SIZE,
+    FEED_FANOUT_LIMIT,
+    FEED_PULL_INTERVAL
+)
+from core.toggles import quote
+from foodgram.models import FeedEntry, Recipe
+from users_authentication.models import UserSubscription
+
+User = get_user_model()
+
+FEED = quote(FeedEntry._meta.db_table)
+RECIPES = quote(Recipe._meta.db_table)
+SUBSCRIPTIONS = quote(UserSubscription._meta.db_table)
+USERS = quote(User._meta.db_table)
+
+
+def insert_entries(select, params):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FEED} (user_id, recipe_id, author_id, pub_date) '
+            f'{select} ON CONFLICT DO NOTHING',
+            params
+        )
+        return cursor.rowcount
+
+
+def fan_out_recipe(recipe_id):
+    return insert_entries(
+        f'SELECT s.user_id, r.id, r.author_id, r.pub_date FROM {RECIPES} r '
+        f'JOIN {USERS} a ON a.id = r.author_id '
+        f'JOIN {SUBSCRIPTIONS} s ON s.subscribed_id = r.author_id '
+        f'WHERE r.id = %s AND a.followers_count <= %s',
+        [recipe_id, FEED_FANOUT_LIMIT]
+    )
+
+
+def backfill_author(user_id, author_id, limit=FEED_BACKFILL_SIZE):
+    User.objects.filter(pk=user_id, feed_synced_at__isnull=True).update(
+        feed_synced_at=timezone.now()
+    )
+    return insert_entries(
+        f'SELECT %s, r.id, r.author_id, r.pub_date FROM {RECIPES} r '
+        f'WHERE r.author_id = %s ORDER BY r.pub_date DESC LIMIT %s',
+        [user_id, author_id, limit]
+    )
+
+
+def backfill_followers(author_id, limit=FEED_BACKFILL_SIZE):
+    return insert_entries(
+        f'SELECT s.user_id, r.id, r.author_id, r.pub_date '
+        f'FROM {SUBSCRIPTIONS} s JOIN ('
+        f'SELECT id, author_id, pub_date FROM {RECIPES} '
+        f'WHERE author_id = %s ORDER BY pub_date DESC LIMIT %s'
+        f') r ON r.author_id = s.subscribed_id WHERE s.subscribed_id = %s',
+        [author_id, limit, author_id]
+    )
+
+
+def remove_author(user_id, author_id):
+    return FeedEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()[0]
+
+
+def is_pull_due(synced, now):
+    return synced is None or now - synced >= timedelta(
+        seconds=FEED_PULL_INTERVAL
+    )
+
+
+def pull_author(user_id, author_id, since, limit=FEED_BACKFILL_SIZE):
+    select = (
+        f'SELECT %s, r.id, r.author_id, r.pub_date FROM {RECIPES} r '
+        f'WHERE r.author_id = %s'
+    )
+    params = [user_id, author_id]
+    if since is not None:
+        select += ' AND r.pub_date >= %s'
+        params.append(connection.ops.adapt_datetimefield_value(since))
+    return insert_entries(
+        f'{select} ORDER BY r.pub_date DESC LIMIT %s', [*params, limit]
+    )
+
+
+@transaction.atomic
+def pull_popular_authors(user_id):
+    now = timezone.now()
+    synced = User.objects.filter(pk=user_id).values_list(
+        'feed_synced_at', flat=True
+    ).first()
+    if not is_pull_due(synced, now) or not User.objects.filter(
+        pk=user_id, feed_synced_at=synced
+    ).update(feed_synced_at=now):
+        return 0
+    since = None
+    if synced is not None:
+        since = synced - timedelta(seconds=FEED_PULL_INTERVAL)
+    return sum(
+        pull_author(user_id, author_id, since)
+        for author_id in UserSubscription.objects.filter(
+            user_id=user_id, subscribed__followers_count__gt=FEED_FANOUT_LIMIT
+        ).values_list('subscribed_id', flat=True)
+    )
@@ -0,0 +1,66 @@
+from io import BytesIO
+from uuid import uuid4
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from core.constants import RECIPE_IMAGE_QUALITY, RECIPE_IMAGE_SIZES
+from foodgram.models import Recipe
+
+VARIANT_FIELDS = {
+    'thumbnail': 'image_thumbnail',
+    'card': 'image_card',
+    'full': 'image',
+}
+
+
+def normalize(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variant(image, size):
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+    buffer = BytesIO()
+    variant.save(
+        buffer, 'JPEG', quality=RECIPE_IMAGE_QUALITY, optimize=True
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def delete_files(names):
+    for name in set(names) - {''}:
+        default_storage.delete(name)
+
+
+def process_recipe_image(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_thumbnail', 'image_card'
+    ).first()
+    if recipe is None or not recipe.image:
+        return
+    old_files = {
+        getattr(recipe, field).name for field in VARIANT_FIELDS.values()
+    }
+    with recipe.image.open('rb') as file:
+        image = normalize(Image.open(file))
+    prefix = f'recipes/{recipe_id}-{uuid4().hex[:8]}'
+    new_files = {
+        field: default_storage.save(
+            f'{prefix}-{variant}.jpg',
+            render_variant(image, RECIPE_IMAGE_SIZES[variant])
+        )
+        for variant, field in VARIANT_FIELDS.items()
+    }
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(updated_at=timezone.now(), **new_files)
+    delete_files(old_files if updated else new_files.values())
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.constants import FEED_BACKFILL_SIZE
+from foodgram.feed import backfill_followers
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ленты подписчиков последними рецептами авторов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=FEED_BACKFILL_SIZE)
+
+    def handle(self, *args, **options):
+        authors = User.objects.filter(
+            followers_count__gt=0, recipes_count__gt=0
+        ).order_by('pk').values_list('pk', flat=True)
+        created = 0
+        for author in authors.iterator():
+            created += backfill_followers(author, options['limit'])
+        User.objects.update(feed_synced_at=timezone.now())
+        self.stdout.write(f'Добавлено записей в ленты: {created}')
@@ -0,0 +1,37 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from core.short_links import encode_short_link, get_recipe_link
+from foodgram.models import Recipe, ShortURL
+
+
+class Command(BaseCommand):
+    help = 'Создаёт короткие ссылки для всех рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        before = ShortURL.objects.count()
+        ids = Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ).iterator(chunk_size=batch_size)
+        while True:
+            batch = list(islice(ids, batch_size))
+            if not batch:
+                break
+            ShortURL.objects.bulk_create(
+                (
+                    ShortURL(
+                        full_link=get_recipe_link(pk),
+                        short_link=encode_short_link(pk)
+                    ) for pk in batch
+                ),
+                batch_size=batch_size,
+                ignore_conflicts=True
+            )
+        self.stdout.write(
+            f'Создано ссылок: {ShortURL.objects.count() - before}'
+        )
@@ -0,0 +1,333 @@
+import json
+import random
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from core.counters import count_related
+from foodgram.models import Ingredient, Recipe, ShoppingCart, Tag
+from users_authentication.models import UserSubscription
+
+User = get_user_model()
+
+SCENARIO_WEIGHTS = {
+    'list': 35,
+    'detail': 20,
+    'favorite': 10,
+    'cart': 10,
+    'subscriptions': 10,
+    'download': 5,
+    'ingredients': 10,
+}
+LOCAL_HOSTS = ('', 'localhost', '127.0.0.1', '::1')
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+)
+
+
+def list_recipes(data, generator):
+    tags = '&'.join(
+        f'tags={slug}' for slug in generator.sample(
+            data['tags'], generator.randint(0, min(2, len(data['tags'])))
+        )
+    )
+    return [('recipes:list', 'get', f'/api/recipes/?limit=6&{tags}')]
+
+
+def recipe_detail(data, generator):
+    recipe = generator.choice(data['recipes'])
+    return [('recipes:detail', 'get', f'/api/recipes/{recipe}/')]
+
+
+def toggle(name, url_path):
+    def scenario(data, generator):
+        path = f'/api/recipes/{generator.choice(data["recipes"])}/{url_path}/'
+        return [
+            (f'recipes:{name}:post', 'post', path),
+            (f'recipes:{name}:delete', 'delete', path),
+        ]
+    return scenario
+
+
+def subscriptions(data, generator):
+    return [(
+        'users:subscriptions', 'get',
+        '/api/users/subscriptions/?limit=6&recipes_limit=3'
+    )]
+
+
+def download_shopping_cart(data, generator):
+    file_type = generator.choice(('txt', 'csv', 'pdf'))
+    return [(
+        'recipes:download_shopping_cart', 'get',
+        f'/api/recipes/download_shopping_cart/?type={file_type}'
+    )]
+
+
+def ingredient_search(data, generator):
+    name = generator.choice(data['ingredients'])
+    prefix = name[:generator.randint(1, min(3, len(name)))]
+    return [('ingredients:list', 'get', f'/api/ingredients/?name={prefix}')]
+
+
+SCENARIOS = {
+    'list': list_recipes,
+    'detail': recipe_detail,
+    'favorite': toggle('favorite', 'favorite'),
+    'cart': toggle('shopping_cart', 'shopping_cart'),
+    'subscriptions': subscriptions,
+    'download': download_shopping_cart,
+    'ingredients': ingredient_search,
+}
+
+
+def percentile(values, rank):
+    index = max(0, min(len(values) - 1, round(rank / 100 * len(values)) - 1))
+    return values[index]
+
+
+def parse_weights(value):
+    weights = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(name)
+        weights[name] = int(weight)
+    return weights
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает API взвешенными сценариями на синтетических данных и '
+        'сохраняет задержки, пропускную способность и число запросов к БД'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--weights', type=parse_weights)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--output')
+        parser.add_argument(
+            '--allow-host', action='append', default=[], dest='allowed_hosts'
+        )
+
+    def check_database(self, allowed_hosts):
+        host = connection.settings_dict.get('HOST') or ''
+        if not settings.DEBUG or host not in (*LOCAL_HOSTS, *allowed_hosts):
+            raise CommandError(
+                'Бенчмарк записывает синтетические данные в базу, поэтому '
+                'запускается только с DEBUG=True на локальной базе данных '
+                f'или на хосте, явно разрешённом через --allow-host {host}'
+            )
+
+    def handle(self, *args, **options):
+        self.check_database(options['allowed_hosts'])
+        weights = {**SCENARIO_WEIGHTS, **(options['weights'] or {})}
+        data = self.prepare(options['users'], options['recipes'])
+        generator = random.Random(options['seed'])
+        plan = [
+            (name, generator.randrange(len(data['tokens'])),
+             generator.getrandbits(32))
+            for name in generator.choices(
+                list(weights), list(weights.values()),
+                k=options['warmup'] + options['requests']
+            )
+        ]
+        self.replay(
+            data, plan[:options['warmup']], options['concurrency'],
+            options['host']
+        )
+        started = perf_counter()
+        samples = self.replay(
+            data, plan[options['warmup']:], options['concurrency'],
+            options['host']
+        )
+        report = self.build_report(
+            samples, perf_counter() - started, weights, options
+        )
+        self.print_report(report)
+        if options['output']:
+            Path(options['output']).write_text(
+                json.dumps(report, ensure_ascii=False, indent=2),
+                encoding='utf-8'
+            )
+
+    def prepare(self, users, recipes):
+        if not Ingredient.objects.exists():
+            call_command('load_data', 'ingredients', 'data/ingredients.csv')
+        Tag.objects.bulk_create(
+            (Tag(name=name, slug=slug) for name, slug in DEFAULT_TAGS),
+            ignore_conflicts=True
+        )
+        missing = recipes - Recipe.objects.count()
+        if missing > 0:
+            call_command(
+                'load_data', 'recipes', count=missing, authors=users, seed=0
+            )
+        user_ids = list(User.objects.filter(
+            username__startswith='staging_'
+        ).order_by('pk').values_list('pk', flat=True)[:users])
+        if len(user_ids) < 2:
+            raise CommandError('Недостаточно пользователей для нагрузки')
+        recipe_ids = list(
+            Recipe.objects.values_list('pk', flat=True)[:5000]
+        )
+        UserSubscription.objects.bulk_create(
+            (
+                UserSubscription(user_id=user, subscribed_id=author)
+                for user in user_ids
+                for author in user_ids[:6] if author != user
+            ),
+            ignore_conflicts=True
+        )
+        ShoppingCart.objects.bulk_create(
+            (
+                ShoppingCart(user_id=user, recipe_id=recipe)
+                for user in user_ids for recipe in recipe_ids[:5]
+            ),
+            ignore_conflicts=True
+        )
+        User.objects.filter(pk__in=user_ids).update(
+            followers_count=count_related(UserSubscription, 'subscribed')
+        )
+        Recipe.objects.filter(pk__in=recipe_ids[:5]).update(
+            in_carts_count=count_related(ShoppingCart, 'recipe')
+        )
+        return {
+            'tokens': [
+                Token.objects.get_or_create(user_id=user)[0].key
+                for user in user_ids
+            ],
+            'recipes': recipe_ids,
+            'tags': list(Tag.objects.values_list('slug', flat=True)),
+            'ingredients': list(
+                Ingredient.objects.values_list('name', flat=True)[:500]
+            ),
+        }
+
+    def replay(self, data, plan, concurrency, host):
+        tasks = Queue()
+        for item in plan:
+            tasks.put(item)
+        samples = []
+        lock = Lock()
+        workers = [
+            Thread(
+                target=self.work, args=(data, tasks, samples, lock, host)
+            ) for _ in range(concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return samples
+
+    def work(self, data, tasks, samples, lock, host):
+        clients = {}
+        try:
+            while True:
+                try:
+                    name, user, seed = tasks.get_nowait()
+                except Empty:
+                    return
+                client = clients.get(user)
+                if client is None:
+                    client = clients[user] = Client(
+                        raise_request_exception=False,
+                        SERVER_NAME=host,
+                        HTTP_AUTHORIZATION=f'Token {data["tokens"][user]}'
+                    )
+                for label, method, path in SCENARIOS[name](
+                    data, random.Random(seed)
+                ):
+                    sample = self.request(client, label, method, path)
+                    with lock:
+                        samples.append(sample)
+        finally:
+            connection.close()
+
+    def request(self, client, label, method, path):
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            response = getattr(client, method)(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = perf_counter() - started
+        response.close()
+        return label, elapsed, len(queries), response.status_code
+
+    def build_report(self, samples, duration, weights, options):
+        endpoints = defaultdict(list)
+        for label, elapsed, queries, status in samples:
+            endpoints[label].append((elapsed, queries, status))
+        report = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'options': {
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+                'concurrency': options['concurrency'],
+                'seed': options['seed'],
+                'weights': weights,
+            },
+            'total': {
+                'requests': len(samples),
+                'errors': sum(status >= 400 for *_, status in samples),
+                'duration': round(duration, 3),
+                'throughput': round(len(samples) / duration, 1),
+            },
+            'endpoints': {},
+        }
+        for label, values in sorted(endpoints.items()):
+            latencies = sorted(elapsed * 1000 for elapsed, *_ in values)
+            queries = [count for _, count, _ in values]
+            report['endpoints'][label] = {
+                'requests': len(values),
+                'errors': sum(status >= 400 for *_, status in values),
+                'throughput': round(len(values) / duration, 1),
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'max_ms': round(latencies[-1], 2),
+                'queries_mean': round(sum(queries) / len(queries), 2),
+                'queries_max': max(queries),
+            }
+        return report
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"endpoint":<34}{"req":>6}{"err":>5}{"p50":>9}{"p95":>9}'
+            f'{"p99":>9}{"sql":>7}'
+        )
+        for label, stats in report['endpoints'].items():
+            self.stdout.write(
+                f'{label:<34}{stats["requests"]:>6}{stats["errors"]:>5}'
+                f'{stats["p50_ms"]:>9}{stats["p95_ms"]:>9}'
+                f'{stats["p99_ms"]:>9}{stats["queries_mean"]:>7}'
+            )
+        total = report['total']
+        self.stdout.write(self.style.SUCCESS(
+            f'Запросов: {total["requests"]}, ошибок: {total["errors"]}, '
+            f'{total["throughput"]} запросов/с'
+        ))
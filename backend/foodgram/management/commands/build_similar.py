@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.loaders import Progress
+from foodgram.similar import build_similar_index
+
+
+class Command(BaseCommand):
+    help = 'Строит индекс похожих рецептов по общим ингредиентам и тегам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        recipes = build_similar_index(
+            options['batch_size'], Progress(self.stdout, 'Пар сходства')
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {recipes}'
+        ))
@@ -0,0 +1,142 @@
+import json
+import sys
+from datetime import datetime, time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from foodgram.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag
+)
+from users_authentication.models import UserSubscription
+
+User = get_user_model()
+
+
+def get_datetime(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает рецепты с авторами, тегами, ингредиентами, избранным, '
+        'корзинами и подписками в NDJSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-')
+        parser.add_argument('--author', action='append', default=[])
+        parser.add_argument('--since', type=get_datetime)
+        parser.add_argument('--until', type=get_datetime)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def get_recipes(self, authors, since, until):
+        recipes = Recipe.objects.order_by()
+        if authors:
+            recipes = recipes.filter(author__email__in=authors)
+        if since:
+            recipes = recipes.filter(pub_date__gte=since)
+        if until:
+            recipes = recipes.filter(pub_date__lt=until)
+        return recipes
+
+    def write(self, file, record_type, **record):
+        file.write(json.dumps(
+            {'type': record_type, **record}, ensure_ascii=False
+        ))
+        file.write('\n')
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            return self.dump(sys.stdout, **options)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            self.dump(file, **options)
+
+    def dump(self, file, batch_size, **options):
+        recipes = self.get_recipes(
+            options['author'], options['since'], options['until']
+        )
+        recipe_ids = recipes.values('pk')
+        favorites = Favorite.objects.filter(favorite__in=recipe_ids)
+        carts = ShoppingCart.objects.filter(recipe__in=recipe_ids)
+        users = User.objects.filter(
+            Q(pk__in=recipes.values('author'))
+            | Q(pk__in=favorites.values('user'))
+            | Q(pk__in=carts.values('user'))
+        )
+        for tag in Tag.objects.order_by('pk').values(
+            'id', 'name', 'slug'
+        ).iterator(chunk_size=batch_size):
+            self.write(file, 'tag', **tag)
+        for ingredient in Ingredient.objects.filter(
+            pk__in=RecipeIngredient.objects.filter(
+                recipe__in=recipe_ids
+            ).values('ingredient')
+        ).order_by('pk').values(
+            'id', 'name', 'measurement_unit'
+        ).iterator(chunk_size=batch_size):
+            self.write(file, 'ingredient', **ingredient)
+        for user in users.order_by('pk').values(
+            'id', 'email', 'username', 'first_name', 'last_name',
+            'password', 'avatar'
+        ).iterator(chunk_size=batch_size):
+            self.write(file, 'user', **user)
+        self.dump_recipes(file, recipes, batch_size)
+        for user, recipe in favorites.order_by('pk').values_list(
+            'user', 'favorite'
+        ).iterator(chunk_size=batch_size):
+            self.write(file, 'favorite', user=user, recipe=recipe)
+        for user, recipe in carts.order_by('pk').values_list(
+            'user', 'recipe'
+        ).iterator(chunk_size=batch_size):
+            self.write(file, 'cart', user=user, recipe=recipe)
+        for user, subscribed in UserSubscription.objects.filter(
+            user__in=users, subscribed__in=users
+        ).order_by('pk').values_list(
+            'user', 'subscribed'
+        ).iterator(chunk_size=batch_size):
+            self.write(file, 'subscription', user=user, subscribed=subscribed)
+
+    def dump_recipes(self, file, recipes, batch_size):
+        last_pk = 0
+        while True:
+            batch = list(recipes.filter(pk__gt=last_pk).order_by('pk').only(
+                'id', 'author', 'name', 'text', 'image', 'cooking_time',
+                'pub_date', 'updated_at'
+            ).prefetch_related('tags', 'recipes_ingredients')[:batch_size])
+            if not batch:
+                return
+            for recipe in batch:
+                self.write(
+                    file, 'recipe',
+                    id=recipe.pk,
+                    author=recipe.author_id,
+                    name=recipe.name,
+                    text=recipe.text,
+                    image=recipe.image.name,
+                    cooking_time=recipe.cooking_time,
+                    pub_date=recipe.pub_date.isoformat(),
+                    updated_at=recipe.updated_at.isoformat(),
+                    tags=[tag.pk for tag in recipe.tags.all()],
+                    ingredients=[
+                        [item.ingredient_id, item.amount]
+                        for item in recipe.recipes_ingredients.all()
+                    ]
+                )
+            last_pk = batch[-1].pk
@@ -1,12 +1,7 @@
-import json
+from pathlib import Path
 
-from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from django.db.utils import IntegrityError
-
-from foodgram.models import Ingredient, Tag
-
-User = get_user_model()
 
 
 class Command(BaseCommand):
@@ -15,17 +10,6 @@ class Command(BaseCommand):
         parser.add_argument("json_to_db")
 
     def handle(self, *args, **options):
-        try:
-            with open('data/ingredients.json', 'r') as file:
-                data = json.load(file)
-                instance = (Ingredient(**ingr) for ingr in data)
-                Ingredient.objects.bulk_create(instance)
-        except IntegrityError:
-            pass
-        try:
-            with open('data/tags.json', 'r') as file_tag:
-                data = json.load(file_tag)
-                instance = (Tag(**d) for d in data)
-                Tag.objects.bulk_create(instance)
-        except IntegrityError:
-            pass
+        call_command('load_data', 'ingredients', 'data/ingredients.json')
+        if Path('data/tags.json').exists():
+            call_command('load_data', 'tags', 'data/tags.json')
@@ -0,0 +1,169 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from core.constants import MAX_LENGTH
+from core.counters import count_related
+from core.loaders import (
+    Progress,
+    batched,
+    get_format,
+    iter_records,
+    reset_sequences
+)
+from foodgram.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+MODELS = {
+    'ingredients': (Ingredient, ('name', 'measurement_unit')),
+    'tags': (Tag, ('name', 'slug')),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково загружает ингредиенты и теги из CSV, JSON или NDJSON '
+        'и генерирует синтетические рецепты'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=(*MODELS, 'recipes'))
+        parser.add_argument('path', nargs='?')
+        parser.add_argument('--format', choices=('csv', 'json', 'ndjson'))
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--count', type=int, default=1000)
+        parser.add_argument('--authors', type=int, default=100)
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        if options['kind'] == 'recipes':
+            return self.generate_recipes(**options)
+        if not options['path']:
+            raise CommandError('Укажите путь к файлу')
+        file_format = options['format'] or get_format(options['path'])
+        if file_format is None:
+            raise CommandError('Не удалось определить формат файла')
+        model, fields = MODELS[options['kind']]
+        self.load_file(
+            model, fields, options['path'], file_format,
+            options['batch_size']
+        )
+
+    def clean(self, record, fields):
+        if not isinstance(record, dict):
+            return None
+        values = {
+            field: str(record.get(field) or '').strip() for field in fields
+        }
+        if not all(values.values()) or any(
+            len(value) > MAX_LENGTH for value in values.values()
+        ):
+            return None
+        return values
+
+    def upsert(self, model, fields, rows):
+        key, *values = fields
+        rows = {row[key]: row for row in rows}
+        existing = model.objects.in_bulk(list(rows), field_name=key)
+        changed = []
+        for name, obj in existing.items():
+            row = rows.pop(name)
+            if any(getattr(obj, field) != row[field] for field in values):
+                for field in values:
+                    setattr(obj, field, row[field])
+                changed.append(obj)
+        with transaction.atomic():
+            model.objects.bulk_update(changed, values)
+            model.objects.bulk_create(
+                (model(**row) for row in rows.values()),
+                ignore_conflicts=True
+            )
+        return len(changed)
+
+    def load_file(self, model, fields, path, file_format, batch_size):
+        before = model.objects.count()
+        progress = Progress(self.stdout, model._meta.verbose_name_plural)
+        skipped = updated = 0
+        with open(path, encoding='utf-8', newline='') as file:
+            records = iter_records(file, file_format, fields)
+            for batch in batched(records, batch_size):
+                rows = [self.clean(record, fields) for record in batch]
+                valid = [row for row in rows if row is not None]
+                skipped += len(rows) - len(valid)
+                updated += self.upsert(model, fields, valid)
+                progress.add(len(rows))
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {model.objects.count() - before}, '
+            f'обновлено: {updated}, '
+            f'пропущено некорректных: {skipped}'
+        ))
+
+    def get_authors(self, count):
+        password = make_password(None)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'staging_{number}',
+                    email=f'staging_{number}@example.com',
+                    first_name='Тестовый',
+                    last_name=f'Автор {number}',
+                    password=password
+                ) for number in range(count)
+            ),
+            ignore_conflicts=True
+        )
+        return list(User.objects.filter(
+            username__startswith='staging_'
+        ).values_list('pk', flat=True)[:count])
+
+    def generate_recipes(self, count, batch_size, authors, seed, **options):
+        generator = random.Random(seed)
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        if not tag_ids or not ingredient_ids:
+            raise CommandError('Сначала загрузите теги и ингредиенты')
+        author_ids = self.get_authors(authors)
+        next_pk = (Recipe.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        progress = Progress(self.stdout, 'Рецепты')
+        for batch in batched(range(next_pk, next_pk + count), batch_size):
+            with transaction.atomic():
+                Recipe.objects.bulk_create(Recipe(
+                    pk=pk,
+                    name=f'Рецепт {pk}',
+                    text=f'Синтетический рецепт номер {pk}',
+                    cooking_time=generator.randint(1, 180),
+                    author_id=generator.choice(author_ids)
+                ) for pk in batch)
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe_id=pk, tag_id=tag_id)
+                    for pk in batch
+                    for tag_id in generator.sample(
+                        tag_ids, generator.randint(1, min(3, len(tag_ids)))
+                    )
+                )
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(
+                        recipe_id=pk,
+                        ingredient_id=ingredient_id,
+                        amount=generator.randint(1, 500)
+                    )
+                    for pk in batch
+                    for ingredient_id in generator.sample(
+                        ingredient_ids,
+                        generator.randint(1, min(8, len(ingredient_ids)))
+                    )
+                )
+                Recipe.objects.filter(
+                    pk__gte=batch[0], pk__lte=batch[-1]
+                ).update_search_vector()
+            progress.add(len(batch))
+        reset_sequences(Recipe)
+        User.objects.filter(pk__in=author_ids).update(
+            recipes_count=count_related(Recipe, 'author')
+        )
+        self.stdout.write(self.style.SUCCESS(f'Создано рецептов: {count}'))
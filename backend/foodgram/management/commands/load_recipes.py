@@ -0,0 +1,251 @@
+import sys
+from itertools import groupby
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.utils.dateparse import parse_datetime
+
+from core.counters import count_related
+from core.loaders import Progress, batched, iter_ndjson
+from foodgram.feed import backfill_followers
+from foodgram.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag
+)
+from foodgram.similar import build_similar_index
+from users_authentication.models import UserSubscription
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает рецепты из NDJSON, выгруженного dump_recipes, заполняет '
+        'ленты подписчиков и перестраивает индекс похожих рецептов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.tags = {}
+        self.ingredients = {}
+        self.users = {}
+        self.recipes = {}
+        self.skipped = 0
+        if options['path'] == '-':
+            self.load(sys.stdin, options['batch_size'])
+        else:
+            with open(options['path'], encoding='utf-8') as file:
+                self.load(file, options['batch_size'])
+        self.update_counters(options['batch_size'])
+        if self.recipes:
+            self.fill_feeds()
+            build_similar_index(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {len(self.recipes)}, '
+            f'пользователей: {len(self.users)}, '
+            f'пропущено записей: {self.skipped}'
+        ))
+
+    def load(self, file, batch_size):
+        loaders = {
+            'tag': self.load_tags,
+            'ingredient': self.load_ingredients,
+            'user': self.load_users,
+            'recipe': self.load_recipes,
+            'favorite': self.load_favorites,
+            'cart': self.load_carts,
+            'subscription': self.load_subscriptions,
+        }
+        records = iter_ndjson(file)
+        for record_type, group in groupby(records, key=itemgetter('type')):
+            if record_type not in loaders:
+                raise CommandError(f'Неизвестный тип записи: {record_type}')
+            progress = Progress(self.stdout, record_type)
+            for batch in batched(group, batch_size):
+                with transaction.atomic():
+                    loaders[record_type](batch)
+                progress.add(len(batch))
+
+    def load_tags(self, batch):
+        Tag.objects.bulk_create(
+            (Tag(name=item['name'], slug=item['slug']) for item in batch),
+            ignore_conflicts=True
+        )
+        existing = dict(Tag.objects.filter(
+            slug__in=[item['slug'] for item in batch]
+        ).values_list('slug', 'pk'))
+        for item in batch:
+            if item['slug'] in existing:
+                self.tags[item['id']] = existing[item['slug']]
+
+    def load_ingredients(self, batch):
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=item['name'],
+                    measurement_unit=item['measurement_unit']
+                ) for item in batch
+            ),
+            ignore_conflicts=True
+        )
+        existing = {
+            (name, unit): pk for name, unit, pk in Ingredient.objects.filter(
+                name__in=[item['name'] for item in batch]
+            ).values_list('name', 'measurement_unit', 'pk')
+        }
+        for item in batch:
+            key = (item['name'], item['measurement_unit'])
+            if key in existing:
+                self.ingredients[item['id']] = existing[key]
+
+    def load_users(self, batch):
+        User.objects.bulk_create(
+            (
+                User(
+                    email=item['email'],
+                    username=item['username'],
+                    first_name=item['first_name'],
+                    last_name=item['last_name'],
+                    password=item['password'],
+                    avatar=item['avatar'] or None
+                ) for item in batch
+            ),
+            ignore_conflicts=True
+        )
+        existing = dict(User.objects.filter(
+            email__in=[item['email'] for item in batch]
+        ).values_list('email', 'pk'))
+        for item in batch:
+            if item['email'] in existing:
+                self.users[item['id']] = existing[item['email']]
+
+    def load_recipes(self, batch):
+        loaded = [item for item in batch if item['author'] in self.users]
+        self.skipped += len(batch) - len(loaded)
+        batch = loaded
+        if not batch:
+            return
+        objects = [
+            Recipe(
+                author_id=self.users[item['author']],
+                name=item['name'],
+                text=item['text'],
+                image=item['image'] or None,
+                cooking_time=item['cooking_time']
+            ) for item in batch
+        ]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(objects)
+        else:
+            for recipe in objects:
+                recipe.save()
+        for item, recipe in zip(batch, objects):
+            self.recipes[item['id']] = recipe.pk
+        recipes = Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in objects]
+        )
+        recipes.update(**{
+            field: Case(
+                *(
+                    When(
+                        pk=self.recipes[item['id']],
+                        then=Value(parse_datetime(item[field]))
+                    ) for item in batch
+                ),
+                output_field=DateTimeField()
+            ) for field in ('pub_date', 'updated_at')
+        })
+        recipes.update_search_vector()
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(
+                recipe_id=self.recipes[item['id']], tag_id=self.tags[tag]
+            )
+            for item in batch
+            for tag in item['tags'] if tag in self.tags
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=self.recipes[item['id']],
+                ingredient_id=self.ingredients[ingredient],
+                amount=amount
+            )
+            for item in batch
+            for ingredient, amount in item['ingredients']
+            if ingredient in self.ingredients
+        )
+
+    def remap(self, batch, **fields):
+        pairs = []
+        for item in batch:
+            values = {
+                field: mapping.get(item[field])
+                for field, mapping in fields.items()
+            }
+            if None in values.values():
+                self.skipped += 1
+            else:
+                pairs.append(values)
+        return pairs
+
+    def load_favorites(self, batch):
+        Favorite.objects.bulk_create(
+            (
+                Favorite(user_id=pair['user'], favorite_id=pair['recipe'])
+                for pair in self.remap(
+                    batch, user=self.users, recipe=self.recipes
+                )
+            ),
+            ignore_conflicts=True
+        )
+
+    def load_carts(self, batch):
+        ShoppingCart.objects.bulk_create(
+            (
+                ShoppingCart(user_id=pair['user'], recipe_id=pair['recipe'])
+                for pair in self.remap(
+                    batch, user=self.users, recipe=self.recipes
+                )
+            ),
+            ignore_conflicts=True
+        )
+
+    def load_subscriptions(self, batch):
+        UserSubscription.objects.bulk_create(
+            (
+                UserSubscription(
+                    user_id=pair['user'], subscribed_id=pair['subscribed']
+                )
+                for pair in self.remap(
+                    batch, user=self.users, subscribed=self.users
+                )
+                if pair['user'] != pair['subscribed']
+            ),
+            ignore_conflicts=True
+        )
+
+    def fill_feeds(self):
+        for author in set(self.users.values()):
+            backfill_followers(author)
+
+    def update_counters(self, batch_size):
+        for batch in batched(self.recipes.values(), batch_size):
+            Recipe.objects.filter(pk__in=batch).update(
+                favorites_count=count_related(Favorite, 'favorite'),
+                in_carts_count=count_related(ShoppingCart, 'recipe')
+            )
+        for batch in batched(set(self.users.values()), batch_size):
+            User.objects.filter(pk__in=batch).update(
+                recipes_count=count_related(Recipe, 'author'),
+                followers_count=count_related(UserSubscription, 'subscribed'),
+                flags_version=F('flags_version') + 1
+            )
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from core.counters import count_related
+from foodgram.models import Favorite, Recipe, ShoppingCart
+from users_authentication.models import UserSubscription
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики избранного, корзин, рецептов и подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def update_in_batches(self, queryset, batch_size, **counters):
+        last = queryset.aggregate(last=Max('pk'))['last'] or 0
+        updated = 0
+        for start in range(0, last, batch_size):
+            updated += queryset.filter(
+                pk__gt=start, pk__lte=start + batch_size
+            ).update(**counters)
+        return updated
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipes = self.update_in_batches(
+            Recipe.objects.order_by(), batch_size,
+            favorites_count=count_related(Favorite, 'favorite'),
+            in_carts_count=count_related(ShoppingCart, 'recipe')
+        )
+        users = self.update_in_batches(
+            User.objects.order_by(), batch_size,
+            recipes_count=count_related(Recipe, 'author'),
+            followers_count=count_related(UserSubscription, 'subscribed')
+        )
+        self.stdout.write(
+            f'Обновлено рецептов: {recipes}, пользователей: {users}'
+        )
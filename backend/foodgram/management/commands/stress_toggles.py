@@ -0,0 +1,199 @@
+import random
+from collections import Counter
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from core.counters import count_related
+from foodgram.feed import backfill_author, remove_author
+from foodgram.models import Favorite, Recipe, ShoppingCart
+from users_authentication.models import UserSubscription
+
+User = get_user_model()
+
+OPERATIONS = {
+    'favorite': ('/api/recipes/{}/favorite/', Favorite, 'favorite'),
+    'cart': ('/api/recipes/{}/shopping_cart/', ShoppingCart, 'recipe'),
+    'subscribe': ('/api/users/{}/subscribe/', UserSubscription, 'subscribed'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Параллельно переключает избранное, корзину и подписки '
+        'синтетических пользователей staging_*, проверяет согласованность '
+        'строк и счётчиков, измеряет пропускную способность и возвращает '
+        'данные в исходное состояние'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=4)
+        parser.add_argument('--recipes', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--host', default='localhost')
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(
+            username__startswith='staging_'
+        ).order_by('pk')[:options['users']])
+        recipes = list(Recipe.objects.filter(
+            author__in=users
+        ).order_by('pk').values_list('pk', flat=True)[:options['recipes']])
+        if len(users) < 2 or not recipes:
+            raise CommandError(
+                'Недостаточно пользователей staging_* или их рецептов, '
+                'сначала выполните load_data recipes'
+            )
+        user_ids = [user.pk for user in users]
+        tokens = [Token.objects.get_or_create(user=user)[0].key
+                  for user in users]
+        targets = {
+            'favorite': recipes,
+            'cart': recipes,
+            'subscribe': user_ids,
+        }
+        before_rows = self.get_rows(user_ids, targets)
+        before_drift = self.get_drift(user_ids, recipes)
+        generator = random.Random(options['seed'])
+        tasks = Queue()
+        for _ in range(options['operations']):
+            operation = generator.choice(list(OPERATIONS))
+            user = generator.randrange(len(users))
+            target = generator.choice([
+                target for target in targets[operation]
+                if operation != 'subscribe' or target != user_ids[user]
+            ])
+            method = generator.choice(('post', 'delete'))
+            tasks.put((operation, user, target, method))
+        results = Counter()
+        statuses = Counter()
+        lock = Lock()
+        started = perf_counter()
+        workers = [
+            Thread(target=self.work, args=(
+                tasks, tokens, user_ids, results, statuses, lock,
+                options['host']
+            )) for _ in range(options['threads'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = perf_counter() - started
+        try:
+            errors = self.verify(
+                user_ids, targets, recipes, before_rows, before_drift,
+                results
+            )
+        finally:
+            self.restore(user_ids, targets, recipes, before_rows)
+        self.stdout.write(
+            f'Операций: {options["operations"]} за {elapsed:.2f} с '
+            f'({options["operations"] / elapsed:.0f}/с), '
+            f'статусы: {dict(sorted(statuses.items()))}'
+        )
+        if statuses.get(500):
+            errors.append(f'Ошибок сервера: {statuses[500]}')
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS('Строки и счётчики согласованы'))
+
+    def work(self, tasks, tokens, user_ids, results, statuses, lock, host):
+        clients = {}
+        try:
+            while True:
+                try:
+                    operation, user, target, method = tasks.get_nowait()
+                except Empty:
+                    return
+                if user not in clients:
+                    clients[user] = Client(
+                        raise_request_exception=False,
+                        SERVER_NAME=host,
+                        HTTP_AUTHORIZATION=f'Token {tokens[user]}'
+                    )
+                path = OPERATIONS[operation][0].format(target)
+                response = getattr(clients[user], method)(path)
+                key = (operation, user_ids[user], target)
+                with lock:
+                    statuses[response.status_code] += 1
+                    if response.status_code == 201:
+                        results[key] += 1
+                    elif response.status_code == 204:
+                        results[key] -= 1
+        finally:
+            connection.close()
+
+    def get_rows(self, user_ids, targets):
+        rows = set()
+        for operation, (_, model, field) in OPERATIONS.items():
+            rows.update(
+                (operation, user, target)
+                for user, target in model.objects.filter(
+                    user__in=user_ids, **{f'{field}__in': targets[operation]}
+                ).values_list('user', field)
+            )
+        return rows
+
+    def get_drift(self, user_ids, recipes):
+        drift = {}
+        for recipe in Recipe.objects.filter(pk__in=recipes):
+            drift[('favorite', recipe.pk)] = (
+                Favorite.objects.filter(favorite=recipe).count()
+                - recipe.favorites_count
+            )
+            drift[('cart', recipe.pk)] = (
+                ShoppingCart.objects.filter(recipe=recipe).count()
+                - recipe.in_carts_count
+            )
+        for user in User.objects.filter(pk__in=user_ids):
+            drift[('subscribe', user.pk)] = (
+                UserSubscription.objects.filter(subscribed=user).count()
+                - user.followers_count
+            )
+        return drift
+
+    def restore(self, user_ids, targets, recipes, before_rows):
+        after_rows = self.get_rows(user_ids, targets)
+        for operation, user, target in after_rows - before_rows:
+            _, model, field = OPERATIONS[operation]
+            model.objects.filter(user=user, **{field: target}).delete()
+            if operation == 'subscribe':
+                remove_author(user, target)
+        for operation, user, target in before_rows - after_rows:
+            _, model, field = OPERATIONS[operation]
+            model.objects.create(user_id=user, **{f'{field}_id': target})
+            if operation == 'subscribe':
+                backfill_author(user, target)
+        Recipe.objects.filter(pk__in=recipes).update(
+            favorites_count=count_related(Favorite, 'favorite'),
+            in_carts_count=count_related(ShoppingCart, 'recipe')
+        )
+        User.objects.filter(pk__in=user_ids).update(
+            followers_count=count_related(UserSubscription, 'subscribed')
+        )
+
+    def verify(self, user_ids, targets, recipes, before_rows, before_drift,
+               results):
+        after_rows = self.get_rows(user_ids, targets)
+        errors = []
+        for key in set(results) | before_rows | after_rows:
+            expected = (key in after_rows) - (key in before_rows)
+            if results[key] != expected:
+                errors.append(
+                    f'{key}: успешных изменений {results[key]}, '
+                    f'фактическое изменение {expected}'
+                )
+        after_drift = self.get_drift(user_ids, recipes)
+        for key, drift in after_drift.items():
+            if drift != before_drift[key]:
+                errors.append(f'Счётчик {key} разошёлся со строками')
+        return errors
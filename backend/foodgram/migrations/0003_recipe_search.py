@@ -0,0 +1,45 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:19
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def fill_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    Recipe.objects.update(search_vector=(
+        django.contrib.postgres.search.SearchVector(
+            'name', weight='A', config='russian'
+        )
+        + django.contrib.postgres.search.SearchVector(
+            'text', weight='B', config='russian'
+        )
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0002_auto_20241017_1443'),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='recipe_name_trigram', opclasses=('gin_trgm_ops',)),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+    ]
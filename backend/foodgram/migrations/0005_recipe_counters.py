@@ -0,0 +1,55 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:23
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Favorite = apps.get_model('foodgram', 'Favorite')
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    ShoppingCart = apps.get_model('foodgram', 'ShoppingCart')
+    User = apps.get_model('users_authentication', 'User')
+    UserSubscription = apps.get_model(
+        'users_authentication', 'UserSubscription'
+    )
+    Recipe.objects.update(
+        favorites_count=count_related(Favorite, 'favorite'),
+        in_carts_count=count_related(ShoppingCart, 'recipe')
+    )
+    User.objects.update(
+        recipes_count=count_related(Recipe, 'author'),
+        followers_count=count_related(UserSubscription, 'subscribed')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0004_recipe_updated_at'),
+        ('users_authentication', '0013_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
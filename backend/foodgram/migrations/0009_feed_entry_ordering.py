@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0008_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='feedentry',
+            options={'ordering': ('-pub_date', '-recipe_id'), 'verbose_name': 'Запись ленты', 'verbose_name_plural': 'Записи ленты'},
+        ),
+    ]
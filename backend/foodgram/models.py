@@ -1,8 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 
 from core.validators import max_check, positive_check
-from core.constants import MAX_DISPLAY_LENGTH, MAX_LENGTH
+from core.constants import MAX_DISPLAY_LENGTH, MAX_LENGTH, SEARCH_CONFIG
 
 
 User = get_user_model()
@@ -51,6 +53,15 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def update_search_vector(self):
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+        ))
+
+
 class Recipe(models.Model):
     name = models.CharField(max_length=MAX_LENGTH, verbose_name='Название')
     author = models.ForeignKey(
@@ -65,6 +76,18 @@ class Recipe(models.Model):
         default=None,
         verbose_name='Изображение'
     )
+    image_thumbnail = models.ImageField(
+        upload_to='recipes/',
+        blank=True,
+        editable=False,
+        verbose_name='Миниатюра'
+    )
+    image_card = models.ImageField(
+        upload_to='recipes/',
+        blank=True,
+        editable=False,
+        verbose_name='Изображение для карточки'
+    )
     text = models.TextField(verbose_name='Описание')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -83,16 +106,65 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах'
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         default_related_name = 'recipes'
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            GinIndex(fields=('search_vector',), name='recipe_search_vector'),
+            GinIndex(
+                fields=('name',),
+                name='recipe_name_trigram',
+                opclasses=('gin_trgm_ops',)
+            ),
+            models.Index(
+                fields=('author', '-pub_date'), name='recipe_author_pub_date'
+            ),
+        ]
 
     def __str__(self):
         return self.name[:MAX_DISPLAY_LENGTH]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        if 'name' in loaded and 'text' in loaded:
+            instance._indexed_text = (loaded['name'], loaded['text'])
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            changed = not {'name', 'text'}.isdisjoint(update_fields)
+        else:
+            changed = (
+                getattr(self, '_indexed_text', None) != (self.name, self.text)
+            )
+        super().save(*args, **kwargs)
+        if changed:
+            Recipe.objects.filter(pk=self.pk).update_search_vector()
+            self._indexed_text = (self.name, self.text)
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
@@ -152,6 +224,98 @@ class ShoppingCart(models.Model):
         ]
 
 
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ('-pub_date', '-recipe_id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'), name='feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'), name='feed_timeline'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.recipe_id}'
+
+
+class RecipeBucket(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarity_buckets'
+    )
+    band = models.PositiveSmallIntegerField(verbose_name='Полоса')
+    bucket = models.BigIntegerField(verbose_name='Корзина')
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'band'), name='recipe_band'
+            )
+        ]
+        indexes = [
+            models.Index(fields=('band', 'bucket'), name='lsh_bucket'),
+        ]
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('-score', 'similar_id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'), name='similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('recipe', '-score', 'similar'),
+                name='similar_recipe_rank'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.similar_id} {self.score:.2f}'
+
+
 class ShortURL(models.Model):
     full_link = models.CharField(max_length=MAX_LENGTH, unique=True)
     short_link = models.CharField(max_length=MAX_LENGTH, unique=True)
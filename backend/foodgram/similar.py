@@ -0,0 +1,249 @@
+import random
+from collections import defaultdict
+from functools import reduce
+from hashlib import blake2b
+from heapq import nlargest
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from core.constants import (
+    SIMILAR_BAND_ROWS,
+    SIMILAR_BANDS,
+    SIMILAR_BUCKET_LIMIT,
+    SIMILAR_LIMIT,
+    SIMILAR_SEED,
+    SIMILAR_TAG_WEIGHT
+)
+from foodgram.models import (
+    Recipe,
+    RecipeBucket,
+    RecipeIngredient,
+    SimilarRecipe
+)
+
+PRIME = (1 << 61) - 1
+generator = random.Random(SIMILAR_SEED)
+PERMUTATIONS = [
+    (generator.randrange(1, PRIME), generator.randrange(PRIME))
+    for _ in range(SIMILAR_BANDS * SIMILAR_BAND_ROWS)
+]
+EMPTY = (frozenset(), frozenset())
+
+
+def get_buckets(ingredients):
+    if not ingredients:
+        return []
+    signature = [
+        min((a * ingredient + b) % PRIME for ingredient in ingredients)
+        for a, b in PERMUTATIONS
+    ]
+    buckets = []
+    for band in range(SIMILAR_BANDS):
+        rows = signature[
+            band * SIMILAR_BAND_ROWS:(band + 1) * SIMILAR_BAND_ROWS
+        ]
+        digest = blake2b(
+            b''.join(value.to_bytes(8, 'big') for value in rows),
+            digest_size=8
+        ).digest()
+        buckets.append((band, int.from_bytes(digest, 'big', signed=True)))
+    return buckets
+
+
+def jaccard(first, second):
+    union = len(first | second)
+    return len(first & second) / union if union else 0.0
+
+
+def get_score(first, second):
+    return (
+        (1 - SIMILAR_TAG_WEIGHT) * jaccard(first[0], second[0])
+        + SIMILAR_TAG_WEIGHT * jaccard(first[1], second[1])
+    )
+
+
+def load_features(recipe_ids=None):
+    features = defaultdict(lambda: (set(), set()))
+    ingredients = RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient_id'
+    )
+    tags = Recipe.tags.through.objects.values_list('recipe_id', 'tag_id')
+    if recipe_ids is not None:
+        ingredients = ingredients.filter(recipe_id__in=recipe_ids)
+        tags = tags.filter(recipe_id__in=recipe_ids)
+    for recipe, ingredient in ingredients.iterator():
+        features[recipe][0].add(ingredient)
+    for recipe, tag in tags.iterator():
+        features[recipe][1].add(tag)
+    return dict(features)
+
+
+def get_scores(recipe_id, features, candidates):
+    own = features.get(recipe_id, EMPTY)
+    scores = {
+        candidate: get_score(own, features.get(candidate, EMPTY))
+        for candidate in candidates if candidate != recipe_id
+    }
+    return {
+        candidate: score for candidate, score in scores.items() if score > 0
+    }
+
+
+def get_top(scores):
+    return nlargest(
+        SIMILAR_LIMIT, scores.items(), key=lambda item: (item[1], -item[0])
+    )
+
+
+def get_buckets_filter(bands):
+    return reduce(or_, (
+        Q(band=band, bucket__in=buckets)
+        for band, buckets in bands.items()
+    ), Q(pk__in=[]))
+
+
+def get_candidates(recipe_ids):
+    keys = defaultdict(list)
+    bands = defaultdict(set)
+    for recipe, band, bucket in RecipeBucket.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'band', 'bucket'):
+        keys[recipe].append((band, bucket))
+        bands[band].add(bucket)
+    members = defaultdict(list)
+    for band, bucket in RecipeBucket.objects.filter(
+        get_buckets_filter(bands)
+    ).values('band', 'bucket').annotate(size=Count('id')).filter(
+        size__gt=SIMILAR_BUCKET_LIMIT
+    ).values_list('band', 'bucket'):
+        bands[band].discard(bucket)
+    for band, bucket, recipe in RecipeBucket.objects.filter(
+        get_buckets_filter(bands)
+    ).values_list('band', 'bucket', 'recipe_id'):
+        members[band, bucket].append(recipe)
+    return {
+        recipe: {
+            candidate for key in keys[recipe] for candidate in members[key]
+        } - {recipe}
+        for recipe in recipe_ids
+    }
+
+
+def replace_lists(recipe_ids, rows):
+    list(Recipe.objects.select_for_update().filter(
+        pk__in=recipe_ids
+    ).order_by('pk').values_list('pk', flat=True))
+    SimilarRecipe.objects.filter(recipe_id__in=recipe_ids).delete()
+    SimilarRecipe.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+@transaction.atomic
+def rank_recipes(recipe_ids):
+    candidates = get_candidates(recipe_ids)
+    features = load_features(set(recipe_ids).union(*candidates.values()))
+    replace_lists(recipe_ids, [
+        SimilarRecipe(recipe_id=recipe, similar_id=similar, score=score)
+        for recipe in recipe_ids
+        for similar, score in get_top(
+            get_scores(recipe, features, candidates[recipe])
+        )
+    ])
+
+
+def update_similar_recipes(recipe_id):
+    if not Recipe.objects.filter(pk=recipe_id).exists():
+        return
+    features = load_features([recipe_id])
+    buckets = get_buckets(features.get(recipe_id, EMPTY)[0])
+    with transaction.atomic():
+        RecipeBucket.objects.filter(recipe_id=recipe_id).delete()
+        RecipeBucket.objects.bulk_create(
+            (
+                RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+                for band, bucket in buckets
+            ),
+            ignore_conflicts=True
+        )
+        candidates = get_candidates([recipe_id])[recipe_id]
+        features.update(load_features(candidates))
+        scores = get_scores(recipe_id, features, candidates)
+        rows = [
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar, score=score)
+            for similar, score in get_top(scores)
+        ]
+        neighbours = defaultdict(dict)
+        for recipe, similar, score in SimilarRecipe.objects.filter(
+            Q(recipe_id__in=scores) | Q(similar_id=recipe_id)
+        ).exclude(recipe_id=recipe_id).values_list(
+            'recipe_id', 'similar_id', 'score'
+        ):
+            neighbours[recipe][similar] = score
+        stale = [
+            recipe for recipe, current in neighbours.items()
+            if recipe_id in current
+            and scores.get(recipe, 0) < current[recipe_id]
+        ]
+        changed = [recipe_id]
+        for candidate, score in scores.items():
+            current = neighbours[candidate]
+            if candidate in stale or (
+                recipe_id not in current
+                and len(current) >= SIMILAR_LIMIT
+                and score <= min(current.values())
+            ):
+                continue
+            current[recipe_id] = score
+            changed.append(candidate)
+            rows.extend(
+                SimilarRecipe(
+                    recipe_id=candidate, similar_id=similar, score=value
+                ) for similar, value in get_top(current)
+            )
+        replace_lists(changed, rows)
+        if stale:
+            rank_recipes(stale)
+
+
+def build_similar_index(batch_size, progress=None):
+    features = load_features()
+    members = defaultdict(list)
+    recipe_buckets = {}
+    for recipe in sorted(features):
+        recipe_buckets[recipe] = get_buckets(features[recipe][0])
+        for key in recipe_buckets[recipe]:
+            members[key].append(recipe)
+    with transaction.atomic():
+        RecipeBucket.objects.all().delete()
+        SimilarRecipe.objects.all().delete()
+        RecipeBucket.objects.bulk_create(
+            (
+                RecipeBucket(recipe_id=recipe, band=band, bucket=bucket)
+                for recipe, buckets in recipe_buckets.items()
+                for band, bucket in buckets
+            ),
+            batch_size=batch_size
+        )
+        rows = []
+        for recipe, buckets in recipe_buckets.items():
+            candidates = set()
+            for key in buckets:
+                if len(members[key]) <= SIMILAR_BUCKET_LIMIT:
+                    candidates.update(members[key])
+            rows.extend(
+                SimilarRecipe(
+                    recipe_id=recipe, similar_id=similar, score=score
+                ) for similar, score in get_top(
+                    get_scores(recipe, features, candidates)
+                )
+            )
+            if len(rows) >= batch_size:
+                SimilarRecipe.objects.bulk_create(rows)
+                if progress is not None:
+                    progress.add(len(rows))
+                rows = []
+        SimilarRecipe.objects.bulk_create(rows)
+        if progress is not None and rows:
+            progress.add(len(rows))
+    return len(recipe_buckets)
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users_authentication', '0011_usersubscription_check_self_subscribe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='flags_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия избранного, корзины и подписок'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users_authentication', '0013_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_synced_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Лента синхронизирована'),
+        ),
+    ]
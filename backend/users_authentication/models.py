@@ -19,6 +19,29 @@ class User(AbstractUser):
         default=None,
         verbose_name='Изображение'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков'
+    )
+    flags_version = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Версия избранного, корзины и подписок'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    feed_synced_at = models.DateTimeField(
+        null=True,
+        editable=False,
+        verbose_name='Лента синхронизирована'
+    )
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
     USERNAME_FIELD = 'email'
 
@@ -28,6 +51,11 @@ class User(AbstractUser):
     def __str__(self):
         return f'{self.username}'
 
+    def bump_flags_version(self):
+        User.objects.filter(pk=self.pk).update(
+            flags_version=models.F('flags_version') + 1
+        )
+
 
 class UserSubscription(models.Model):
     user = models.ForeignKey(